@@ -0,0 +1 @@
+# Reproducible benchmarks for the V-Party dashboard pipeline
@@ -0,0 +1,97 @@
+# Check the index lookups and the pipeline against plain pandas on synthetic data
+#
+#   python -m benchmarks.check --scale 1
+#
+# Nothing here is timed. Year ranges and snapshots of every country are compared
+# with pandas masks and groupby, and the figures of a year range without rows are
+# built with an empty figure cache, so each check really runs its code path.
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.synthetic import write_csv
+from vparty.data import read_dataset
+from vparty.figcache import FigureCache
+from vparty.figures import country_party_colors
+from vparty.index import DatasetIndex
+from vparty.labels import LabelTable
+from vparty.stages import Pipeline
+
+VARIABLE = 'v2paimmig_osp'
+
+
+# Year ranges and snapshot years to check for a country: before, inside and after its years
+def check_years(first_year, last_year, rng):
+    middle = int(rng.integers(first_year, last_year + 1))
+    return [first_year - 10, first_year - 1, first_year, middle, last_year, last_year + 5]
+
+
+# year_range_rows against a boolean mask over the whole frame
+def check_year_ranges(index, rng):
+    data = index.data
+    countries, years = data['country_name'].to_numpy(), data['year'].to_numpy()
+    failures = []
+    for country_name in index.countries:
+        in_country = countries == country_name
+        test_years = check_years(*index.year_bounds(country_name), rng)
+        for start_year in test_years:
+            for end_year in test_years:
+                expected = np.flatnonzero(in_country & (years >= start_year) & (years <= end_year))
+                if not np.array_equal(index.year_range_rows(country_name, start_year, end_year), expected):
+                    failures.append(('year_range_rows', country_name, start_year, end_year))
+    return failures
+
+
+# snapshot_rows against the last row per party of a groupby over the rows up to the year
+def check_snapshots(index, rng):
+    data = index.data
+    failures = []
+    for country_name in index.countries:
+        rows = data.iloc[index.country_slices[country_name]]
+        for year in check_years(*index.year_bounds(country_name), rng):
+            before = rows[rows['year'] <= year]
+            expected = np.sort(before.groupby(before['v2paenname'].cat.codes.to_numpy()).tail(1).index.to_numpy())
+            if not np.array_equal(np.sort(index.snapshot_rows(country_name, year)), expected):
+                failures.append(('snapshot_rows', country_name, year))
+    return failures
+
+
+# The charts and legend of a year range before the first year still build
+def check_empty_range(index, labels):
+    pipeline = Pipeline(index, labels, country_party_colors(index), 'check', FigureCache())
+    empty_range = (index.first_year - 10, index.first_year - 1)
+    failures = []
+    for country_name in index.countries[:5]:
+        try:
+            pipeline.line_json(country_name, VARIABLE, empty_range)
+            pipeline.scatter_json(country_name, VARIABLE, empty_range)
+            pipeline.legend(country_name, VARIABLE, empty_range)
+        except Exception as error:
+            failures.append(('empty_range', country_name, type(error).__name__, str(error).strip().split('\n')[0]))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.check', description="Check index lookups and pipeline edge cases on synthetic data.")
+    parser.add_argument('--scale', type=float, default=1, help="dataset size as a multiple of the real row count")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='vparty-check-') as workdir:
+        csv_path = os.path.join(workdir, 'vparty.csv')
+        write_csv(csv_path, args.scale, args.seed, extra_columns=0)
+        index = DatasetIndex(read_dataset(csv_path))
+    rng = np.random.default_rng(args.seed)
+
+    failures = check_year_ranges(index, rng) + check_snapshots(index, rng) + check_empty_range(index, LabelTable(index.data))
+    for failure in failures:
+        print(*failure)
+    print(f"{len(index.countries)} countries checked, {len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Compare two benchmark reports written by benchmarks.run
+#
+#   python -m benchmarks.compare baseline.json candidate.json
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Rows of (scale, stage, baseline s, candidate s, ratio, baseline peak, candidate peak)
+def compare(baseline, candidate):
+    baseline_results = {result['scale']: result for result in baseline['results']}
+    rows = []
+    for result in candidate['results']:
+        base = baseline_results.get(result['scale'])
+        if base is None:
+            continue
+        for name, stats in result['stages'].items():
+            if name not in base['stages']:
+                continue
+            before = base['stages'][name]
+            ratio = stats['median_s'] / before['median_s'] if before['median_s'] else float('nan')
+            rows.append((result['scale'], name, before['median_s'], stats['median_s'], ratio, before['peak_bytes'], stats['peak_bytes']))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare', description="Compare two benchmark reports.")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=1.2, help="flag stages at least this many times slower")
+    args = parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline {baseline['environment']['commit']} vs candidate {candidate['environment']['commit']}")
+    print(f"{'scale':>6} {'stage':<28} {'base ms':>10} {'new ms':>10} {'ratio':>7} {'base MiB':>9} {'new MiB':>9}")
+    for scale, name, before, after, ratio, before_peak, after_peak in compare(baseline, candidate):
+        flag = '  <-- slower' if ratio >= args.threshold else ''
+        print(f"{scale:>6g} {name:<28} {before * 1000:>10.2f} {after * 1000:>10.2f} {ratio:>7.2f} "
+              f"{before_peak / 2**20:>9.1f} {after_peak / 2**20:>9.1f}{flag}")
+
+
+if __name__ == '__main__':
+    main()
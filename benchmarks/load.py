@@ -0,0 +1,216 @@
+# Headless multi-session load test for midterm_v2.py
+#
+#   python -m benchmarks.load --data-dir DIR --sessions 20 --reruns 10
+#
+# Starts `streamlit run midterm_v2.py` headlessly in DIR (which holds the CSV),
+# or attaches to a running server with --url/--pid, then opens N websocket
+# sessions that speak the same protocol as the browser: each session requests
+# a rerun with randomized country / party position selectbox values and waits
+# for the script_finished message. Reports throughput, rerun latency
+# percentiles and the server's resident memory as sessions are added.
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'midterm_v2.py')
+COUNTRY_LABEL = "Select Country"
+POSITION_LABEL = "Select Party Position"
+
+
+# Resident set size of a process in bytes, from /proc
+def process_rss(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Start a headless Streamlit server for the app; returns (process, base url)
+def start_server(data_dir, port=None, env=None):
+    port = port or _free_port()
+    command = [sys.executable, '-m', 'streamlit', 'run', APP_PATH,
+               '--server.headless', 'true', '--server.port', str(port),
+               '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false']
+    server_env = dict(os.environ, PYTHONPATH=os.path.dirname(APP_PATH), **(env or {}))
+    process = subprocess.Popen(command, cwd=data_dir, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Streamlit server did not start on port {port}")
+
+
+class Session:
+    def __init__(self, base_url):
+        self.url = base_url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+        self.connection = None
+        self.widgets = {}
+        self.latencies = []
+        self.errors = 0
+        self.bytes_received = 0
+
+    async def connect(self):
+        self.connection = await websocket_connect(self.url, subprotocols=['streamlit'])
+
+    # Request a rerun with the given widget values and wait until it finishes
+    async def rerun(self, widget_values=()):
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        for widget_id, index in widget_values:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.int_value = index
+        started = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ConnectionError("Server closed the session")
+            self.bytes_received += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_kind = element.WhichOneof('type')
+                if element_kind == 'selectbox':
+                    self.widgets[element.selectbox.label] = (element.selectbox.id, len(element.selectbox.options))
+                elif element_kind == 'exception':
+                    self.errors += 1
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                self.latencies.append(time.perf_counter() - started)
+                return
+
+    # Rerun with a random country and party position
+    async def random_rerun(self, rng):
+        values = []
+        for label in (COUNTRY_LABEL, POSITION_LABEL):
+            if label in self.widgets:
+                widget_id, n_options = self.widgets[label]
+                values.append((widget_id, rng.randrange(n_options)))
+        await self.rerun(values)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = np.asarray(values) * 1000
+    return {f"p{p}_ms": float(np.percentile(values, p)) for p in (50, 90, 95, 99)} | {'max_ms': float(values.max())}
+
+
+async def run_load(base_url, sessions, reruns, think_time, seed, pid=None, ramp=1):
+    rng = random.Random(seed)
+    rss = []
+
+    def sample_rss(label):
+        if pid:
+            rss.append({'sessions': label, 'rss_bytes': process_rss(pid)})
+
+    sample_rss(0)
+    # Open sessions in batches of `ramp`, running each one's first rerun, so the
+    # server's memory can be sampled as the number of live sessions grows
+    opened = []
+    for start in range(0, sessions, ramp):
+        batch = [Session(base_url) for _ in range(min(ramp, sessions - start))]
+        await asyncio.gather(*(session.connect() for session in batch))
+        await asyncio.gather(*(session.rerun() for session in batch))
+        opened += batch
+        sample_rss(len(opened))
+
+    async def drive(session):
+        for _ in range(reruns):
+            await session.random_rerun(rng)
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(session) for session in opened))
+    elapsed = time.perf_counter() - started
+    sample_rss(f"{sessions} after load")
+
+    for session in opened:
+        session.close()
+    latencies = [latency for session in opened for latency in session.latencies[1:]]
+    report = {
+        'sessions': sessions,
+        'reruns_per_session': reruns,
+        'reruns': len(latencies),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else None,
+        'latency': percentiles(latencies),
+        'first_rerun_latency': percentiles([session.latencies[0] for session in opened]),
+        'errors': sum(session.errors for session in opened),
+        'bytes_received_per_rerun': sum(session.bytes_received for session in opened) / max(1, sum(len(s.latencies) for s in opened)),
+        'rss': rss,
+    }
+    # Memory added per extra live session, from the first to the last opened session
+    if pid and len(rss) >= 3 and sessions > 1:
+        report['rss_per_session_bytes'] = (rss[-2]['rss_bytes'] - rss[1]['rss_bytes']) / (rss[-2]['sessions'] - rss[1]['sessions'])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.load', description="Headless multi-session load test for midterm_v2.py.")
+    parser.add_argument('--data-dir', default='.', help="directory containing V-Dem-CPD-Party-V2.csv (server working directory)")
+    parser.add_argument('--url', help="attach to a running server instead of starting one")
+    parser.add_argument('--pid', type=int, help="server process id for RSS sampling when using --url")
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument('--reruns', type=int, default=10, help="randomized reruns per session")
+    parser.add_argument('--ramp', type=int, default=1, help="sessions opened per RSS sample")
+    parser.add_argument('--think-time', type=float, default=0.0, help="mean seconds between a session's reruns")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE', help="extra environment for the started server")
+    parser.add_argument('--out', help="write the report as JSON to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    process = None
+    base_url, pid = args.url, args.pid
+    if base_url is None:
+        process, base_url = start_server(args.data_dir, env=dict(item.split('=', 1) for item in args.env))
+        pid = process.pid
+    try:
+        report = asyncio.run(run_load(base_url, args.sessions, args.reruns, args.think_time, args.seed, pid, args.ramp))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# Time each stage of the dashboard pipeline on synthetic data
+#
+#   python -m benchmarks.run --scale 1 10 --repeat 5 --out bench.json
+#
+# Every stage is timed `repeat` times (median and min are reported), then run
+# once more under tracemalloc for its peak Python-heap allocation. Memory-mapped
+# store columns are not heap allocations, so they do not count towards the peak.
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from benchmarks.synthetic import write_csv
+from vparty import store
+from vparty.compare import comparison_line_figure, comparison_scatter_figure
+from vparty.data import read_dataset
+from vparty.figures import country_party_colors, legend_entries, line_figure, scatter_figure
+from vparty.index import DatasetIndex
+from vparty.labels import LABEL_BINS, LabelTable
+from vparty.partitions import PartitionStore, ingest
+from vparty.payload import compact_json
+
+VARIABLE = 'v2paimmig_osp'
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment():
+    return {
+        'commit': _git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+class StageTimer:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.stages = {}
+
+    # Time `fn` and measure its peak allocation; returns the result of the last call
+    def run(self, name, fn):
+        durations = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            result = fn()
+            durations.append(time.perf_counter() - started)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stages[name] = {
+            'median_s': statistics.median(durations),
+            'min_s': min(durations),
+            'peak_bytes': peak,
+        }
+        return result
+
+
+def bench_scale(scale, repeat, seed, extra_columns, workdir):
+    csv_path = os.path.join(workdir, f"vparty-x{scale}.csv")
+    store_dir = os.path.join(workdir, f"store-x{scale}")
+    write_csv(csv_path, scale, seed, extra_columns)
+    timer = StageTimer(repeat)
+
+    # Loading
+    timer.run('csv_load', lambda: read_dataset(csv_path))
+    timer.run('store_build', lambda: store.build_store(csv_path, store_dir))
+    data = timer.run('store_load', lambda: store.read_store(store_dir))
+    index = timer.run('index_build', lambda: DatasetIndex(data))
+    data = index.data
+
+    # Country selection on the largest country: legacy mask scan vs index slice
+    country = max(index.country_slices, key=lambda name: index.country_slices[name].stop - index.country_slices[name].start)
+    row_slice = index.country_slices[country]
+    timer.run('country_filter_mask', lambda: data[data['country_name'] == country])
+    rows = timer.run('country_filter_index', lambda: index.country_frame(country))
+
+    # Chunked per-country ingest, then loading the largest country's partition alone
+    partition_dir = os.path.join(workdir, f"partitions-x{scale}")
+    timer.run('partition_ingest', lambda: ingest(csv_path, partition_dir))
+    partitions = PartitionStore(partition_dir)
+    timer.run('partition_load', lambda: partitions.load(country))
+
+    # Labels for every variable of the whole dataset, then the per-country gather
+    timer.run('labeling', lambda: [LabelTable(data).codes(column) for column in LABEL_BINS])
+    labels = LabelTable(data)
+    timer.run('hover_text', lambda: [labels.strings(column, row_slice) for column in ('v2pariglef_osp', 'ep_v6_lib_cons', VARIABLE)])
+
+    # Figures for the largest country
+    party_colors = country_party_colors(index)[country]
+    timer.run('legend', lambda: legend_entries(rows, VARIABLE, party_colors))
+    fig = timer.run('line_figure', lambda: line_figure(rows, VARIABLE, party_colors))
+    fig_3d_text = timer.run('scatter_figure_text', lambda: scatter_figure(rows, VARIABLE, party_colors, labels, row_slice, hover_mode='text'))
+    fig_3d = timer.run('scatter_figure_customdata', lambda: scatter_figure(rows, VARIABLE, party_colors, labels, row_slice, hover_mode='customdata'))
+    payloads = {}
+    for name, figure in [('line', fig), ('scatter_text', fig_3d_text), ('scatter_customdata', fig_3d)]:
+        payloads[name] = len(timer.run(f"json_{name}", figure.to_json))
+
+    # All-countries comparison views
+    compare_fig = timer.run('compare_line_figure', lambda: comparison_line_figure(data, VARIABLE))
+    compare_fig_3d = timer.run('compare_scatter_figure', lambda: comparison_scatter_figure(data, VARIABLE))
+    payloads['compare_line'] = len(timer.run('json_compare_line', compare_fig.to_json))
+    payloads['compare_scatter'] = len(timer.run('json_compare_scatter', compare_fig_3d.to_json))
+
+    # The same figures after payload compaction
+    for name, figure in [('line', fig), ('scatter_customdata', fig_3d), ('compare_line', compare_fig), ('compare_scatter', compare_fig_3d)]:
+        payloads[f"{name}_compact"] = timer.run(f"compact_{name}", lambda: compact_json(figure.to_json()))[1]['after']
+
+    return {
+        'scale': scale,
+        'rows': len(data),
+        'csv_bytes': os.path.getsize(csv_path),
+        'country': country,
+        'country_rows': row_slice.stop - row_slice.start,
+        'stages': timer.stages,
+        'payload_bytes': payloads,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description="Time each stage of the dashboard pipeline on synthetic data.")
+    parser.add_argument('--scale', type=float, nargs='+', default=[1], help="dataset sizes as multiples of the real row count")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per stage")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--extra-columns', type=int, default=100, help="unused filler columns in the CSV")
+    parser.add_argument('--out', help="write results as JSON to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='vparty-bench-') as workdir:
+        results = [bench_scale(scale, args.repeat, args.seed, args.extra_columns, workdir) for scale in args.scale]
+    report = {
+        'environment': environment(),
+        'config': {'repeat': args.repeat, 'seed': args.seed, 'extra_columns': args.extra_columns, 'variable': VARIABLE},
+        'results': results,
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
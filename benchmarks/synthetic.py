@@ -0,0 +1,68 @@
+# Seeded generator of V-Party-shaped data
+#
+# Produces the columns the dashboard reads (same names as the real file) plus
+# filler columns so the CSV is about as wide as a real release. Scores follow a
+# per-party random walk on their real scales, with a share of missing values.
+import numpy as np
+import pandas as pd
+
+from vparty.data import ID_COLUMNS, POSITION_COLUMNS
+
+# Approximate row count of the V-Party v2 country-party-date file (scale 1)
+BASE_ROWS = 11_000
+COUNTRIES = 178
+MISSING_SHARE = 0.1
+
+
+def generate(scale=1, seed=0, extra_columns=100):
+    rng = np.random.default_rng(seed)
+    n_rows = int(BASE_ROWS * scale)
+
+    # Split rows over countries, then over parties with 2-30 observations each
+    country_rows = rng.multinomial(n_rows, rng.dirichlet(np.full(COUNTRIES, 2.0)))
+    countries, parties, years = [], [], []
+    for c, rows in enumerate(country_rows):
+        p = 0
+        while rows > 0:
+            length = min(rows, int(rng.integers(2, 31)))
+            countries += [f"Country {c:03d}"] * length
+            parties += [f"Party {c:03d}-{p:03d}"] * length
+            # Sorted election years; repeats stand in for several elections in one year
+            years += list(np.sort(rng.integers(1900, 2021, length)))
+            rows -= length
+            p += 1
+
+    data = {
+        'country_name': countries,
+        'v2paenname': parties,
+        'year': np.asarray(years, dtype=np.int64),
+    }
+    party_start = np.r_[True, np.asarray(parties[1:]) != np.asarray(parties[:-1])]
+
+    # Random walk per party, restarted at each party's first row, clipped to the scale
+    def walk(low, high, step):
+        values = rng.normal(0, step, n_rows)
+        values[party_start] = rng.uniform(low, high, party_start.sum())
+        group = np.cumsum(party_start) - 1
+        cumulative = np.cumsum(values)
+        offsets = cumulative[party_start] - values[party_start]
+        values = np.clip(cumulative - offsets[group], low - 0.2, high + 0.2)
+        values[rng.random(n_rows) < MISSING_SHARE] = np.nan
+        return values
+
+    for column in POSITION_COLUMNS:
+        data[column] = walk(0, 4, 0.3)
+    data['v2pariglef_osp'] = walk(0, 6, 0.3)
+    data['ep_v6_lib_cons'] = walk(0, 10, 0.5)
+    for i in range(extra_columns):
+        data[f"v2pa_extra{i:03d}"] = rng.random(n_rows)
+
+    frame = pd.DataFrame(data)
+    # Shuffle the row order so loaders cannot rely on the file being sorted
+    return frame.iloc[rng.permutation(n_rows)].reset_index(drop=True)[ID_COLUMNS + [c for c in data if c not in ID_COLUMNS]]
+
+
+def write_csv(path, scale=1, seed=0, extra_columns=100):
+    frame = generate(scale, seed, extra_columns)
+    frame.to_csv(path, index=False)
+    return len(frame)
@@ -1,12 +1,139 @@
 # Import packages
+import atexit
+import os
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import plotly.io as pio
+
+from vparty.clusters import Clustering, find_clusters
+from vparty.data import CSV_FILE_PATH
+from vparty.export import EXPORT_FORMATS, EXPORT_MIME_TYPES, export_bytes
+from vparty.figcache import FigureCache, figure_from_dict, figure_from_json
+from vparty.figures import country_party_colors, family_legend_entries, legend_html
+from vparty.index import DatasetIndex
+from vparty.labels import LabelTable
+from vparty.metadata import coding_map, label_map, question_map
+from vparty.partitions import INDEX_FILE, PartitionStore
+from vparty.prebuild import PrebuiltStore
+from vparty.profiling import PROFILE_ENABLED, RerunProfiler, activate, stage, write_record
+from vparty.similarity import SimilarityIndex
+from vparty.stages import Pipeline
+from vparty.store import STORE_DIR, dataset_fingerprint, load_dataset, source_stat
+from vparty.trajectories import SMOOTH_WINDOW, biggest_shifts, load_trajectories
+from vparty.warmup import WARMUP_ENABLED, AccessCounts, Warmup, access_counts_path
+
+# Import data and build the country/party row index once per process; both are shared
+# read-only by every session. The source file's size and mtime are part of the key so
+# an updated CSV is picked up.
+@st.cache_resource(max_entries=1)
+def load_index(csv_file_path, stat):
+    return DatasetIndex(load_dataset(csv_file_path))
+
+# Score-to-category labels for every row, computed once per variable and shared likewise
+@st.cache_resource(max_entries=1)
+def load_labels(csv_file_path, stat):
+    return LabelTable(load_index(csv_file_path, stat).data)
+
+# Colour of every party, assigned once for the whole dataset
+@st.cache_resource(max_entries=1)
+def load_party_colors(csv_file_path, stat):
+    return country_party_colors(load_index(csv_file_path, stat))
+
+# Fingerprint of the dataset contents, used to invalidate cached figures
+@st.cache_resource(max_entries=1)
+def load_fingerprint(csv_file_path, stat):
+    return dataset_fingerprint(csv_file_path)
+
+# Built figures and legends shared by every session, keyed by (country, position, chart)
+@st.cache_resource
+def load_figure_cache():
+    return FigureCache()
+
+# Memoized stages from the dataset to the figures, each cached on its own inputs
+@st.cache_resource(max_entries=1)
+def load_pipeline(csv_file_path, stat):
+    return Pipeline(
+        load_index(csv_file_path, stat),
+        load_labels(csv_file_path, stat),
+        load_party_colors(csv_file_path, stat),
+        load_fingerprint(csv_file_path, stat),
+        load_figure_cache(),
+    )
 
-# Import data
-csv_file_path = 'V-Dem-CPD-Party-V2.csv'
-data = pd.read_csv(csv_file_path)
+# Normalized score matrix for the similar-parties search, built once per dataset
+@st.cache_resource(max_entries=1)
+def load_similarity(csv_file_path, stat):
+    return SimilarityIndex(load_index(csv_file_path, stat).data)
+
+# Trends, changes and shifts of every party series, precomputed once per dataset
+@st.cache_resource(max_entries=1)
+def load_trajectory_table(csv_file_path, stat):
+    return load_trajectories(csv_file_path)
+
+# Ideological families persisted by `python -m vparty cluster`; only ever read here.
+# The results file's modification time is part of the key so a new run is picked up.
+@st.cache_resource(max_entries=1)
+def load_clustering(stem, mtime_ns):
+    return Clustering(stem)
+
+# Prebuilt mode: serve charts from a directory written by `python -m vparty prebuild`
+# and never load the dataset itself
+PREBUILT_DIR = os.environ.get('VPARTY_PREBUILT_DIR')
+
+@st.cache_resource
+def load_prebuilt(prebuilt_dir):
+    return PrebuiltStore(prebuilt_dir)
+
+# Partitioned mode: read per-country files written by `python -m vparty ingest` and
+# only ever open the partition of the selected country. The index file's stat is part
+# of the key so a new ingest is picked up.
+PARTITION_DIR = os.environ.get('VPARTY_PARTITION_DIR')
+
+@st.cache_resource(max_entries=1)
+def load_partitions(partition_dir, stat):
+    return PartitionStore(partition_dir)
+
+# Stages over one country's partition; the most recently viewed countries stay loaded
+@st.cache_resource(max_entries=16)
+def load_partition_pipeline(partition_dir, stat, country_name):
+    partitions = load_partitions(partition_dir, stat)
+    index = DatasetIndex(partitions.load(country_name))
+    return Pipeline(index, LabelTable(index.data), country_party_colors(index), partitions.fingerprint, load_figure_cache())
+
+# Views of each (country, position) pair, persisted for the warm-up of later runs
+@st.cache_resource
+def load_access_counts(path):
+    access_counts = AccessCounts(path)
+    atexit.register(access_counts.flush)
+    return access_counts
+
+# Optional warm-up (VPARTY_WARMUP=1): the first session starts it once per process and
+# carries on right away; the dataset, labels and the most viewed charts load in the background
+@st.cache_resource(max_entries=1)
+def start_warmup(csv_file_path, stat):
+    return Warmup(lambda: load_pipeline(csv_file_path, stat), load_access_counts(access_counts_path(STORE_DIR))).start()
+
+# Time each stage of this rerun when profiling is on (VPARTY_PROFILE=1 or ?profile=1)
+profiler = None
+if PROFILE_ENABLED or st.experimental_get_query_params().get('profile') == ['1']:
+    profiler = RerunProfiler()
+activate(profiler)
+
+warmup = None
+if WARMUP_ENABLED and not PREBUILT_DIR and not PARTITION_DIR:
+    warmup = start_warmup(CSV_FILE_PATH, source_stat(CSV_FILE_PATH))
+
+with stage('load'):
+    if PREBUILT_DIR:
+        prebuilt = load_prebuilt(PREBUILT_DIR)
+        countries = prebuilt.countries
+    elif PARTITION_DIR:
+        partition_stat = source_stat(os.path.join(PARTITION_DIR, INDEX_FILE))
+        countries = load_partitions(PARTITION_DIR, partition_stat).countries
+    else:
+        dataset_stat = source_stat(CSV_FILE_PATH)
+        pipeline = load_pipeline(CSV_FILE_PATH, dataset_stat)
+        countries = pipeline.index.countries
 
 # Add a title, caption, and introductory paragraph
 st.title("Exploring the Positions and Ideologies of Political Parties")
@@ -15,208 +142,123 @@ st.caption("Project By: Graham Diedrich")
 st.write("📊 This visualization presents time-series data of the ideological positions of major political parties from 178 countries. The data is sourced from the V-Party dataset, which includes assessments of party organization and identity as reflected by experts in political science. The goal of this web-app is to allow political scientisits and other policy professionals insights into the relation between party positions and their ideologies, both contemporarily and across time.")
 st.write("🗳 Below, there are **two interactive visuals**. The first allows the user to view the political positions for parties for a given country, based on a key issue. The scoring system can be used to determine the meaning behind these position scores. The second visual outlines the position score in relation to the parties ideological position on the social and economic spectrum.")
 
-# Dictionary mapping variable names to user-friendly labels
-label_map = {
-    "v2paanteli_osp": "Anti-Elitism",
-    "v2papeople_osp": "People-Centrism",
-    "v2paopresp_osp": "Political Opponents",
-    "v2paplur_osp": "Political Pluralism",
-    "v2paminor_osp": "Minority Rights",
-    "v2paviol_osp": "Rejection of Political Violence",
-    "v2paimmig_osp": "Immigration",
-    "v2palgbt_osp": "LGBT Social Equality",
-    "v2paculsup_osp": "Cultural Superiority",
-    "v2parelig_osp": "Religious Principles",
-    "v2pagender_osp": "Gender Equality",
-    "v2pawomlab_osp": "Working Women"
-}
-
 # Function to format the select box display
 def format_func(key):
     return label_map[key]
 
 # Sidebar for user input
 st.sidebar.header("Select Options")
-country_name = st.sidebar.selectbox("Select Country", data['country_name'].unique())
+COMPARE_VIEW = "Compare countries"
+# Comparing countries needs the whole dataset, so prebuilt and partitioned modes only offer the single-country view
+view = "Single country" if PREBUILT_DIR or PARTITION_DIR else st.sidebar.radio("View", ["Single country", COMPARE_VIEW])
+if view == COMPARE_VIEW:
+    all_countries = st.sidebar.checkbox("All countries")
+    compare_countries = countries if all_countries else st.sidebar.multiselect("Select Countries", countries, default=countries[:2])
+    country_name = ", ".join(compare_countries) if len(compare_countries) <= 3 else f"{len(compare_countries)} Countries"
+else:
+    country_name = st.sidebar.selectbox("Select Country", countries)
 identity_score = st.sidebar.selectbox(
     "Select Party Position",
     options=list(label_map.keys()),
     format_func=format_func
 )
 
-filtered_data = data[data['country_name'] == country_name]
-
-# Create a line graph with Plotly
-party_options = filtered_data['v2paenname'].unique()
-
-# Filter the party options based on the filtered data
-filtered_party_options = filtered_data['v2paenname'].unique()
-
-party_colors = {party: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, party in enumerate(party_options)}
-fig = px.line(filtered_data, x='year', y=identity_score, color='v2paenname', color_discrete_map=party_colors, labels={'year': 'Year', identity_score: label_map[identity_score]})
-
-# Set a custom range for the x-axis
-min_year = filtered_data['year'].min()
-max_year = filtered_data['year'].max()
-fig.update_layout(xaxis=dict(range=[min_year, max_year]))
+# Count the view for the warm-up of later runs (the charts it warms need the whole dataset)
+if view != COMPARE_VIEW and not PREBUILT_DIR and not PARTITION_DIR:
+    load_access_counts(access_counts_path(STORE_DIR)).record(country_name, identity_score)
+
+# In partitioned mode the stages run over the selected country's partition only
+if PARTITION_DIR:
+    with stage('load_partition'):
+        pipeline = load_partition_pipeline(PARTITION_DIR, partition_stat, country_name)
+
+# Year range of both charts, and optionally a 3D snapshot of each party's latest
+# scores at one year (prebuilt charts always cover every year)
+years = snapshot = None
+if view != COMPARE_VIEW and not PREBUILT_DIR:
+    first_year, last_year = pipeline.index.year_bounds(country_name)
+    year_range = (first_year, last_year)
+    if first_year < last_year:
+        year_range = st.sidebar.slider("Years", first_year, last_year, (first_year, last_year))
+    # The full range shares its cached figures with the unfiltered view
+    years = None if year_range == (first_year, last_year) else year_range
+    if st.sidebar.checkbox("3D snapshot at one year"):
+        snapshot = year_range[1]
+        if year_range[0] < year_range[1]:
+            snapshot = st.sidebar.slider("Snapshot year", year_range[0], year_range[1], year_range[1])
+# Trends, families and similar parties are aligned with the rows of the whole dataset,
+# so they are only offered in the single-country view with the whole dataset loaded
+full_dataset_view = view != COMPARE_VIEW and not PREBUILT_DIR and not PARTITION_DIR
+show_trends = full_dataset_view and st.sidebar.checkbox("Show trends and shifts")
+FAMILY_COLORING = "Ideological family"
+color_by = "Party"
+if full_dataset_view:
+    color_by = st.sidebar.radio("Colour 3D points by", ["Party", FAMILY_COLORING])
+    if color_by == FAMILY_COLORING:
+        cluster_stem = find_clusters(STORE_DIR, pipeline.fingerprint)
+        if cluster_stem is None:
+            st.sidebar.info("No ideological families for this dataset yet. Run `python -m vparty cluster` to compute them.")
+            color_by = "Party"
+        else:
+            clustering = load_clustering(cluster_stem, os.stat(f"{cluster_stem}.npz").st_mtime_ns)
+            k_families = st.sidebar.select_slider("Number of families", clustering.k_values, value=clustering.k_values[len(clustering.k_values) // 2])
+if profiler:
+    profiler.context.update(view=view, country=country_name, variable=identity_score, years=years, snapshot=snapshot)
+
+if view == COMPARE_VIEW:
+    if not compare_countries:
+        st.info("Select at least one country to compare.")
+        st.stop()
+    compare_key = 'all' if all_countries else tuple(sorted(compare_countries))
+
+    # WebGL line chart with downsampled series, and a 3D view that aggregates into voxels when large
+    with stage('line_figure'):
+        fig = figure_from_json(pipeline.compare_line_json(compare_key, identity_score))
+    with stage('scatter_figure'):
+        fig_3d = figure_from_json(pipeline.compare_scatter_json(compare_key, identity_score))
+    fig.update_traces(showlegend=False)
+    legend = pipeline.compare_legend(compare_key)
+elif PREBUILT_DIR:
+    # Read both charts and the legend from the prebuilt blob
+    with stage('prebuilt_read'):
+        blob = prebuilt.read(country_name, identity_score)
+        fig = figure_from_dict(blob['line'])
+        fig_3d = figure_from_dict(blob['scatter'])
+        legend = legend_html(blob['legend'])
+else:
+    # Create a line graph with Plotly
+    with stage('line_figure'):
+        if show_trends:
+            trajectories = load_trajectory_table(CSV_FILE_PATH, dataset_stat)
+            fig = figure_from_json(pipeline.trend_line_json(country_name, identity_score, trajectories, years))
+        else:
+            fig = figure_from_json(pipeline.line_json(country_name, identity_score, years))
+
+    # 3D Scatter plot creation
+    with stage('scatter_figure'):
+        if color_by == FAMILY_COLORING:
+            fig_3d = figure_from_json(pipeline.family_scatter_json(country_name, identity_score, clustering, k_families, years, snapshot))
+        else:
+            fig_3d = figure_from_json(pipeline.scatter_json(country_name, identity_score, years, snapshot))
+
+    # Legend of the parties with at least one score for the selected position
+    with stage('legend'):
+        legend = pipeline.legend(country_name, identity_score, years)
+    if years and len(pipeline.country(country_name, years).rows) == 0:
+        st.info(f"No observations for {country_name} between {years[0]} and {years[1]}; parties are only scored in election years.")
 
 # Add subheader and introductory paragraph for graph
-st.header(f"{label_map[identity_score]} Scores for Parties in {country_name}")
+years_caption = f", {years[0]}-{years[1]}" if years else ""
+st.header(f"{label_map[identity_score]} Scores for Parties in {country_name}{years_caption}")
 st.write(f"📈 This line graph examines party positions related to {label_map[identity_score].lower()} across time. To better interpret these scores, please use the question and coding boxes for more information.")
 
-# Define function to map integer scores to categories for anti-elitism
-def map_anti_elitism(score):
-    if 0 <= score < 1:
-        return "Rhetoric not important."
-    elif 1 <= score < 2:
-        return "Rhetoric somewhat important."
-    elif 2 <= score < 3:
-        return "Rhetoric important."
-    else:
-        return "Rhetoric very important."
-
-# Define function to map integer scores to categories for people-centrism
-def map_people_centrism(score):
-    if 0 <= score < 1:
-        return "Never centers ordinary people."
-    elif 1 <= score < 2:
-        return "Doesn't usually center ordinary people."
-    elif 2 <= score < 3:
-        return "Usually centers ordinary people."
-    else:
-        return "Always centers ordinary people."
-    
-# Define function to map integer scores to categories for political opponents
-def map_pol_oppo(score):
-    if 0 <= score < 1:
-        return "Always attacts opponents."
-    elif 1 <= score < 2:
-        return "Usually attacts opponents."
-    elif 2 <= score < 3:
-        return "Doesn't usually attact opponents."
-    else:
-        return "Never attacts opponents."
-
-# Define function to map integer scores to categories for political pluralism
-def map_pol_plur(score):
-    if 0 <= score < 1:
-        return "Not all all committed."
-    elif 1 <= score < 2:
-        return "Weakly committed."
-    elif 2 <= score < 3:
-        return "Committed."
-    else:
-        return "Fully committed."
-
-# Define function to map integer scores to categories for minority rights
-def map_minority_rights(score):
-    if 0 <= score < 1:
-        return "Always against minority rights."
-    elif 1 <= score < 2:
-        return "Usually against minority rights."
-    elif 2 <= score < 3:
-        return "Usually supports minority rights."
-    else:
-        return "Always supports minority rights."
-    
-# Define function to map integer scores to categories for political violence
-def map_pol_viol(score):
-    if 0 <= score < 1:
-        return "Encourages violence."
-    elif 1 <= score < 2:
-        return "Sometimes encourages violence."
-    elif 2 <= score < 3:
-        return "Generally discourages violence."
-    else:
-        return "Always discourages violence."
-    
-# Define function to map integer scores to categories for immigration
-def map_immigration(score):
-    if 0 <= score < 1:
-        return "Strongly opposes."
-    elif 1 <= score < 2:
-        return "Opposes."
-    elif 2 <= score < 3:
-        return "Supports."
-    else:
-        return "Strongly supports."
-
-# Define function to map integer scores to categories for LGBT social equality
-def map_lgbt(score):
-    if 0 <= score < 1:
-        return "Strongly opposes."
-    elif 1 <= score < 2:
-        return "Opposes."
-    elif 2 <= score < 3:
-        return "Supports."
-    else:
-        return "Strongly supports."
-
-# Define function to map integer scores to categories for cultural superiority
-def map_cult_s(score):
-    if 0 <= score < 1:
-        return "Strongly promotes."
-    elif 1 <= score < 2:
-        return "Promotes."
-    elif 2 <= score < 3:
-        return "Opposes."
-    else:
-        return "Strongly opposes."
-
-# Define function to map integer scores to categories for religious principles
-def map_relg(score):
-    if 0 <= score < 1:
-        return "Always invokes."
-    elif 1 <= score < 2:
-        return "Often invokes."
-    elif 2 <= score < 3:
-        return "Rarely invokes."
-    else:
-        return "Never invokes."
-
-# Define function to map integer scores to categories for gender equality
-def map_gender_eq(score):
-    if 0 <= score < 1:
-        return "None."
-    elif 1 <= score < 2:
-        return "Small minority."
-    elif 2 <= score < 3:
-        return "Large minority."
-    else:
-        return "Balanced."
-
-# Define function to map integer scores to categories for working women
-def map_working_women(score):
-    if 0 <= score < 1:
-        return "Strongly opposes."
-    elif 1 <= score < 2:
-        return "Opposes."
-    elif 2 <= score < 3:
-        return "Supports."
-    else:
-        return "Strongly supports."
-     
-# Create a dictionary to map party positions to their corresponding mapping functions
-mapping_functions = {
-    "v2paanteli_osp": map_anti_elitism,
-    "v2papeople_osp": map_people_centrism,
-    "v2paopresp_osp": map_pol_oppo,
-    "v2paplur_osp": map_pol_plur,
-    "v2paminor_osp": map_minority_rights,
-    "v2paviol_osp": map_pol_viol,
-    "v2paimmig_osp": map_immigration,
-    "v2palgbt_osp": map_lgbt,
-    "v2paculsup_osp": map_cult_s,
-    "v2parelig_osp": map_relg,
-    "v2pagender_osp": map_gender_eq,
-    "v2pawomlab_osp": map_working_women
-}
-
-# Remove the legend from the graph
-fig.update_traces(showlegend=False)
-
 # Display the line graph
-st.plotly_chart(fig)
+with stage('render_line'):
+    st.plotly_chart(fig)
+if show_trends:
+    st.caption(f"Dotted lines: {SMOOTH_WINDOW}-observation moving average. Diamonds: shifts of at least {trajectories.thresholds[identity_score]:.2f} points since the party's previous score.")
+    with st.expander(f"Biggest {label_map[identity_score].lower()} shifts across all countries"):
+        st.dataframe(biggest_shifts(pipeline.index.data, trajectories, identity_score), hide_index=True)
 
 # Set up the layout for the legend and additional information
 col1, col2 = st.columns([3, 3])
@@ -224,114 +266,7 @@ col1, col2 = st.columns([3, 3])
 # Display the legend in col1
 with col1:
     st.subheader("Legend")
-    for party in filtered_party_options:
-        color = party_colors[party]
-        if filtered_data[filtered_data['v2paenname'] == party][identity_score].notna().any():
-            st.write(f"<div style='display: flex; align-items: center;'><div style='background-color: {color}; width: 20px; height: 10px; margin-right: 5px;'></div> {party}</div>", unsafe_allow_html=True)
-
-# Dictionary mapping variable names to corresponding questions
-question_map = {
-    "v2paanteli_osp": "How important is anti-elite rhetoric for this party?",
-    "v2papeople_osp": "Do leaders of this party glorify the ordinary people and identify themselves as part of them?",
-    "v2paopresp_osp": "Prior to this election, have leaders of this party used severe personal attacks or tactics of demonization against their opponents?",
-    "v2paplur_osp": "Prior to this election, to what extent was the leadership of this political party clearly committed to free and fair elections with multiple parties, freedom of speech, media, assembly and association?",
-    "v2paminor_osp": "According to the leadership of this party, how often should the will of the majority be implemented even if doing so would violate the rights of minorities?",
-    "v2paviol_osp": "To what extent does the leadership of this party explicitly discourage the use of violence against domestic political opponents?",
-    "v2paimmig_osp": "What is the party’s position regarding immigration into the country?",
-    "v2palgbt_osp": "What is this party’s position toward social equality for the lesbian, gay, bisexual, and transgender (LGBT) community?",
-    "v2paculsup_osp": "To what extent does the party leadership promote the cultural superiority of a specific social group or the nation as a whole?",
-    "v2parelig_osp": "To what extent does this party invoke God, religion, or sacred/religious texts to justify its positions?",
-    "v2pagender_osp": "What is the share of women in national-level leadership positions of this political party?",
-    "v2pawomlab_osp": "To what extent does this party support the equal participation of women in the labor market?"
-}
-
-# Dictionary mapping variable names to corresponding coding system
-coding_map = {
-    "v2paanteli_osp": [
-        "0: Not at all important. The leadership of this party never makes statements against the elite.",
-        "1: Not important. The leadership of this party rarely makes statements against the elite.",
-        "2: Somewhat important. The leadership of this party sometimes makes statements against the elite.",
-        "3: Important. The leadership of this party often makes statements against the elite.",
-        "4: Very important. The leadership of this party makes statements against the elite whenever possible."
-    ],
-    "v2papeople_osp": [
-        "0: Never. The party leadership never glorifies and identifies with the ordinary people.",
-        "1: Usually not. The party leadership generally does not glorify and identify with the ordinary people.",
-        "2: About half of the time. The party leadership sometimes glorifies and identifies with the ordinary people.",
-        "3: Usually. The party leadership generally glorifies and identifies with the ordinary people, which they claim to represent.",
-        "4: Always. The party leadership always glorifies and identifies with the ordinary people, which they claim to represent."
-    ],
-    "v2paopresp_osp": [
-        "0: Always. Party leaders always used severe personal attacks or tactics of demonization against their opponents.",
-        "1: Usually. Party leaders usually used severe personal attacks or tactics of demonization against their opponents.",
-        "2: About half of the time. Party leaders sometimes used severe personal attacks or tactics of demonization against their opponents.",
-        "3: Usually not. Party leaders usually did not use severe personal attacks or tactics of demo- nization against their opponents.",
-        "4: Never. Party leaders never used severe personal attacks or tactics of demonization against their opponents."
-    ],
-    "v2paplur_osp": [
-        "0: Not at all committed. The party leadership was not at all committed to free and fair, multi-party elections, freedom of speech, media, assembly and association.",
-        "1: Not committed. The party leadership was not committed to free and fair, multi-party elections, freedom of speech, media, assembly and association.",
-        "2: Weakly committed. The party leadership was weakly committed to free and fair, multi- party elections, freedom of speech, media, assembly and association.",
-        "3: Committed. The party leadership was committed to free and fair, multi-party elections, freedom of speech, media, assembly and association.",
-        "4: Fully committed. The party leadership was fully committed to free and fair, multi-party elections, freedom of speech, media, assembly and association."
-    ],
-    "v2paminor_osp": [
-        "0: Always. The leadership of this party argues that the will of the majority should always determine policy even if such policy violates minority rights.",
-        "1: Usually. The leadership of this party argues that the will of the majority should usually determine policy even if such policy violates minority rights.",
-        "2: Half of the time. The leadership of this party argues that the will of the majority should about half of the time determine policy even if such policy violate minority rights.",
-        "3: Usually not. The leadership of this party argues that the will of the majority should usually not determine policy if such policy violates minority rights.",
-        "4: Never. The leadership of this party argues that the will of the majority should never determine policy if such policy violates minority rights."
-    ],
-    "v2paviol_osp": [
-        "0: Encourages. Leaders of this party often encourage the use of violence against domestic political opponents.",
-        "1: Sometimes encourages. Leaders of this party sometimes encourage the use of violence against domestic political opponents and generally refrain from discouraging it.",
-        "2: Discourages about half of the time. Leaders of this party occasionally discourage the use of violence against domestic political opponents, and do not encourage it.",
-        "3: Generally discourages. Leaders of this party often discourage the use of violence against its domestic political opponents.",
-        "4: Consistently discourages. Leaders of this party consistently reject the use of violence against its domestic political opponents."
-    ],
-    "v2paimmig_osp": [
-        "0: Strongly opposes. This party strongly opposes all or almost all forms of immigration into the country.",
-        "1: Opposes. This party opposes most forms of immigration into the country.",
-        "2: Ambiguous/No position. This party has no clear policy with regard to immigration into the country.",
-        "3: Supports. This party supports most forms of immigration into the country.",
-        "4: Strongly supports. This party strongly supports all or almost all forms of immigration into the country."
-    ],
-    "v2palgbt_osp": [
-        "0: Strongly opposes. This party is strongly opposed to LGBT social equality.",
-        "1: Opposes. This party is opposed to LGBT social equality.",
-        "2: Ambiguous/No position. This party has no clear policy with regard to LGBT social equality.",
-        "3: Supports. This party supports LGBT social equality.",
-        "4: Strongly supports. This party strongly supports LGBT social equality."
-    ],
-    "v2paculsup_osp": [
-        "0: Strongly promotes. The party strongly promotes the cultural superiority of a specific social group or the nation as a whole.",
-        "1: Promotes. The party promotes the cultural superiority of a specific social group or the nation as a whole.",
-        "2: Ambiguous. The party does not take a specific position on the cultural superiority of a specific social group or the nation as a whole.",
-        "3: Opposes. The party opposes the promotion of the cultural superiority of a specific social group or the nation as a whole.",
-        "4: Strongly opposes. The party strongly opposes the promotion of the cultural superiority of a specific social group or the nation as a whole."
-    ],
-    "v2parelig_osp": [
-        "0: Always, or almost always. The party almost always invokes God, religion, or sacred/religious texts to justify its positions.",
-        "1: Often, but not always. The party often, but not always, invokes God, religion, or religious texts to justify its positions.",
-        "2: About half of the time. The party about half of the time invokes God, religion, or religious texts to justify its positions.",
-        "3: Rarely. The party rarely invokes God, religion, or religious texts to justify its positions.",
-        "4: Never. The party never invokes God, religion, or religious texts to justify its positions."
-    ],
-    "v2pagender_osp": [
-        "0: None.",
-        "1: Small minority (about 1-15%).",
-        "2: Medium minority (about 16-25%).",
-        "3: Large minority (about 26-39%).",
-        "4: Balanced (about 40% or more)."
-    ],
-    "v2pawomlab_osp": [
-        "0: Strongly opposes. This party strongly opposes all or almost all types of measures that support the equal participation of women in the labor market.",
-        "1: Opposes. This party opposes most types of measures that support the equal participation of women in the labor market.",
-        "2: Ambiguous/No position. This party has no clear policy with regard to measures that support the equal participation of women in the labor market.",
-        "3: Supports. This party supports most types of measures that support the equal participation of women in the labor market.",
-        "4: Strongly supports. This party strongly supports all or almost all types of measures that support the equal participation of women in the labor market."
-    ],
-}
+    st.write(legend, unsafe_allow_html=True)
 
 # Question and coding display
 with col2:
@@ -343,222 +278,56 @@ with col2:
             for rating in coding_map[identity_score]:
                 st.write(rating)
 
+# Download the rows behind the charts: this country, the chosen variables and the year range.
+# The export is only built on request and kept in this session, not in the shared figure cache.
+if view != COMPARE_VIEW and not PREBUILT_DIR:
+    with st.expander("Download data"):
+        download_variables = st.multiselect("Variables", list(label_map), default=[identity_score], format_func=format_func)
+        download_format = st.radio("Format", EXPORT_FORMATS, horizontal=True, format_func=str.upper)
+        selection = (country_name, tuple(download_variables), years, download_format)
+        if download_variables and st.button("Prepare download"):
+            with stage('export'):
+                st.session_state['download'] = (selection, export_bytes(pipeline.index, [country_name], download_variables, years, download_format))
+        prepared = st.session_state.get('download')
+        if prepared and prepared[0] == selection:
+            years_suffix = f"-{years[0]}-{years[1]}" if years else ""
+            st.download_button(f"Download {download_format.upper()}", prepared[1], mime=EXPORT_MIME_TYPES[download_format],
+                               file_name=f"vparty-{country_name.replace(' ', '_')}{years_suffix}.{download_format}")
+        st.caption("For several countries at once use `python -m vparty export`.")
+
 # Title and introductory paragraph for 3D scatter plot
 st.markdown(f"<h2 style='padding-top: 20px;'><b>{label_map[identity_score]} Scores on the Political Spectrum</b></h2>", unsafe_allow_html=True)
+if snapshot is not None:
+    st.caption(f"Snapshot: each party's latest scores in or before {snapshot}.")
 st.write(f"🗺️ This interactive 3D scatter plot compares three contemporary variables: a party's economic ideology, social ideology, and {label_map[identity_score].lower()} position. Hover over each point to view party name, economic and social ideology, as well as {label_map[identity_score].lower()} position.")
 
-# Define function to map integer scores to categories for economic position
-def map_economic_category(score):
-    if score < 1:
-        return "Far-Left"
-    elif score < 2:
-        return "Left"
-    elif score < 3:
-        return "Center-Left"
-    elif score < 4:
-        return "Center"
-    elif score < 5:
-        return "Center-Right"
-    elif score < 6:
-        return "Right"
-    else:
-        return "Far-Right"
-
-# Define function to map integer scores to categories for social position
-def map_social_category(score):
-    if score < 2:
-        return "Very Liberal"
-    elif score < 4:
-        return "Liberal"
-    elif score < 7:
-        return "Moderate"
-    elif score < 9:
-        return "Conservative"
-    else:
-        return "Very Conservative"
-
-# Define function to map integer scores to categories for anti-elitism
-def map_anti_elitism(score):
-    if 0 <= score < 1:
-        return "Rhetoric not important."
-    elif 1 <= score < 2:
-        return "Rhetoric somewhat important."
-    elif 2 <= score < 3:
-        return "Rhetoric important."
-    else:
-        return "Rhetoric very important."
-
-# Define function to map integer scores to categories for people-centrism
-def map_people_centrism(score):
-    if 0 <= score < 1:
-        return "Never centers ordinary people."
-    elif 1 <= score < 2:
-        return "Doesn't usually center ordinary people."
-    elif 2 <= score < 3:
-        return "Usually centers ordinary people."
-    else:
-        return "Always centers ordinary people."
-    
-# Define function to map integer scores to categories for political opponents
-def map_pol_oppo(score):
-    if 0 <= score < 1:
-        return "Always attacts opponents."
-    elif 1 <= score < 2:
-        return "Usually attacts opponents."
-    elif 2 <= score < 3:
-        return "Doesn't usually attact opponents."
-    else:
-        return "Never attacts opponents."
-
-# Define function to map integer scores to categories for political pluralism
-def map_pol_plur(score):
-    if 0 <= score < 1:
-        return "Not all all committed."
-    elif 1 <= score < 2:
-        return "Weakly committed."
-    elif 2 <= score < 3:
-        return "Committed."
-    else:
-        return "Fully committed."
-
-# Define function to map integer scores to categories for minority rights
-def map_minority_rights(score):
-    if 0 <= score < 1:
-        return "Always against minority rights."
-    elif 1 <= score < 2:
-        return "Usually against minority rights."
-    elif 2 <= score < 3:
-        return "Usually supports minority rights."
-    else:
-        return "Always supports minority rights."
-    
-# Define function to map integer scores to categories for political violence
-def map_pol_viol(score):
-    if 0 <= score < 1:
-        return "Encourages violence."
-    elif 1 <= score < 2:
-        return "Sometimes encourages violence."
-    elif 2 <= score < 3:
-        return "Generally discourages violence."
-    else:
-        return "Always discourages violence."
-    
-# Define function to map integer scores to categories for immigration
-def map_immigration(score):
-    if 0 <= score < 1:
-        return "Strongly opposes."
-    elif 1 <= score < 2:
-        return "Opposes."
-    elif 2 <= score < 3:
-        return "Supports."
-    else:
-        return "Strongly supports."
-
-# Define function to map integer scores to categories for LGBT social equality
-def map_lgbt(score):
-    if 0 <= score < 1:
-        return "Strongly opposes."
-    elif 1 <= score < 2:
-        return "Opposes."
-    elif 2 <= score < 3:
-        return "Supports."
-    else:
-        return "Strongly supports."
-
-# Define function to map integer scores to categories for cultural superiority
-def map_cult_s(score):
-    if 0 <= score < 1:
-        return "Strongly promotes."
-    elif 1 <= score < 2:
-        return "Promotes."
-    elif 2 <= score < 3:
-        return "Opposes."
-    else:
-        return "Strongly opposes."
-
-# Define function to map integer scores to categories for religious principles
-def map_relg(score):
-    if 0 <= score < 1:
-        return "Always invokes."
-    elif 1 <= score < 2:
-        return "Often invokes."
-    elif 2 <= score < 3:
-        return "Rarely invokes."
-    else:
-        return "Never invokes."
-
-# Define function to map integer scores to categories for gender equality
-def map_gender_eq(score):
-    if 0 <= score < 1:
-        return "None."
-    elif 1 <= score < 2:
-        return "Small minority."
-    elif 2 <= score < 3:
-        return "Large minority."
-    else:
-        return "Balanced."
-
-# Define function to map integer scores to categories for working women
-def map_working_women(score):
-    if 0 <= score < 1:
-        return "Strongly opposes."
-    elif 1 <= score < 2:
-        return "Opposes."
-    elif 2 <= score < 3:
-        return "Supports."
-    else:
-        return "Strongly supports."
-     
-# Create a dictionary to map party positions to their corresponding mapping functions
-mapping_functions = {
-    "v2paanteli_osp": map_anti_elitism,
-    "v2papeople_osp": map_people_centrism,
-    "v2paopresp_osp": map_pol_oppo,
-    "v2paplur_osp": map_pol_plur,
-    "v2paminor_osp": map_minority_rights,
-    "v2paviol_osp": map_pol_viol,
-    "v2paimmig_osp": map_immigration,
-    "v2palgbt_osp": map_lgbt,
-    "v2paculsup_osp": map_cult_s,
-    "v2parelig_osp": map_relg,
-    "v2pagender_osp": map_gender_eq,
-    "v2pawomlab_osp": map_working_women
-}
-
-# 3D Scatter plot creation
-fig_3d = go.Figure(data=[go.Scatter3d(
-    x=filtered_data['v2pariglef_osp'],
-    y=filtered_data['ep_v6_lib_cons'],
-    z=filtered_data[identity_score],
-    text=[f"<b>Party:</b> {party}<br><b>Economic Position:</b> {map_economic_category(x)}<br><b>Social Position:</b> {map_social_category(y)}<br><b>{label_map[identity_score]}:</b> {mapping_functions[identity_score](z)}" 
-          for party, x, y, z in zip(filtered_data['v2paenname'], filtered_data['v2pariglef_osp'], filtered_data['ep_v6_lib_cons'], filtered_data[identity_score])], 
-    hovertemplate=' %{text} <extra></extra>',  # remove X, Y, and Z labels
-    mode='markers',
-    marker=dict(
-        size=8,
-        color=[party_colors[party] for party in filtered_data['v2paenname']],  # set color to the party color from party_colors
-        colorscale='Viridis',  # choose a colorscale
-        opacity=0.8
-    )
-)])
-
-# Layout configuration for the 3D scatter plot
-fig_3d.update_layout(scene=dict(
-    xaxis_title='Economic Left-Right Scale',
-    yaxis_title='Social Liberalism-Conservatism Scale',
-    zaxis_title=label_map[identity_score],
-    xaxis=dict(title=dict(font=dict(size=12)), range=[6, 0]),  # reverse the range
-    yaxis=dict(title=dict(font=dict(size=12))),
-    zaxis=dict(title=dict(font=dict(size=12))),
-), 
-margin=dict(l=0, r=0, b=0, t=0))
-
-# Configuring the frame
-fig_3d.update_layout(scene_aspectmode='cube',
-                    scene_aspectratio=dict(x=1, y=1, z=0.8))
-
 # Display the 3D scatter plot
-st.plotly_chart(fig_3d)
+with stage('render_scatter'):
+    st.plotly_chart(fig_3d)
+if color_by == FAMILY_COLORING:
+    st.write(legend_html(family_legend_entries(clustering.family_names(k_families))), unsafe_allow_html=True)
+    st.caption(f"Families from mini-batch k-means over all {clustering.meta['clustered_rows']} party-years, named after the economic and social position of their centre.")
+
+# Similar parties: the party-years elsewhere closest to a chosen party-year, across all
+# position and ideology scores (needs the whole dataset, so not in prebuilt/partitioned mode)
+if full_dataset_view:
+    st.markdown("<h2 style='padding-top: 20px;'><b>Similar Parties</b></h2>", unsafe_allow_html=True)
+    st.write(f"🔎 Pick a party and year in {country_name} to find the party-years in other countries with the most similar ideology and positions across all {len(label_map)} position variables.")
+    party_col, year_col, k_col = st.columns([3, 1, 1])
+    similar_party = party_col.selectbox("Party", pipeline.index.parties(country_name))
+    party_rows = pipeline.index.party_slices[country_name][similar_party]
+    party_years = pipeline.index.data['year'].to_numpy()[party_rows].tolist()
+    # Options are row offsets in the party's series: a year with several elections has
+    # several rows, numbered "#2", "#3", ... after the first
+    year_labels = [f"{year} #{party_years[:i].count(year) + 1}" if party_years[:i].count(year) else str(year) for i, year in enumerate(party_years)]
+    similar_row = year_col.selectbox("Year", range(len(party_years)), index=len(party_years) - 1, format_func=lambda i: year_labels[i])
+    k = k_col.number_input("Results", min_value=1, max_value=50, value=10)
+    with stage('similarity'):
+        similar = load_similarity(CSV_FILE_PATH, dataset_stat).query(party_rows.start + similar_row, k=int(k))
+    if similar.empty:
+        st.info("This party-year has too few scores to compare.")
+    else:
+        st.dataframe(similar, hide_index=True)
 
 # Add subheader and paragraph for intended takeaways
 st.markdown("<h2 style='padding-top: 20px;'><b>Intended Takeaways</b></h2>", unsafe_allow_html=True)
@@ -566,4 +335,25 @@ st.write("🎓 Through the exploration of this database, users should ideally be
 st.write("- Understand how political party positions are variable, changing across time.")
 st.write("- Compare political party positions within a given country.")
 st.write("- Explore trends in party positions as a result of a nation's political landscape.")
-st.write("- Examine how party ideological placement relates to policy positioning.")
\ No newline at end of file
+st.write("- Examine how party ideological placement relates to policy positioning.")
+
+# Profiler panel and log record for this rerun
+if profiler:
+    profiler.payload_bytes = {'line': len(pio.to_json(fig, validate=False)), 'scatter': len(pio.to_json(fig_3d, validate=False))}
+    record = profiler.record()
+    write_record(record)
+    activate(None)
+    with st.sidebar.expander("Profiler"):
+        st.write(f"Rerun: **{record['total_ms']:.1f} ms**")
+        st.table({'Stage': list(record['stages_ms']), 'ms': [round(ms, 1) for ms in record['stages_ms'].values()]})
+        st.write(f"Payload: line {record['payload_bytes']['line'] / 1024:.1f} KiB, 3D {record['payload_bytes']['scatter'] / 1024:.1f} KiB")
+        if not PREBUILT_DIR:
+            stage_stats = pipeline.stats()
+            st.table({'Cached stage': list(stage_stats), 'hits': [counts['hits'] for counts in stage_stats.values()], 'misses': [counts['misses'] for counts in stage_stats.values()]})
+            st.write("Figure cache:", pipeline.figure_cache.stats())
+            if warmup:
+                st.write("Warm-up:", warmup.stats())
+            payload_stats = pipeline.payload_stats()
+            if payload_stats:
+                st.table({'Figure stage': list(payload_stats), 'KiB before': [round(sizes['before'] / 1024, 1) for sizes in payload_stats.values()],
+                          'KiB after': [round(sizes['after'] / 1024, 1) for sizes in payload_stats.values()]})
@@ -0,0 +1 @@
+# Helpers shared by the V-Party dashboard (midterm_v2.py)
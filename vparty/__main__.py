@@ -0,0 +1,140 @@
+# Command-line entry point: python -m vparty <command>
+import argparse
+import os
+import sys
+
+from vparty import api, clusters, export, partitions, prebuild, profiling, store, trajectories
+from vparty.data import COLUMN_DTYPES, CSV_FILE_PATH, SCORE_COLUMNS, USED_COLUMNS
+from vparty.index import DatasetIndex
+
+
+def build_store_command(args):
+    meta = store.ensure_store(args.csv, args.cache_dir, force=args.force)
+    print(f"{meta['rows']} rows from {meta['source']} ({meta['sha256'][:12]}) in {args.cache_dir}")
+
+
+# Columns and dtypes of `name` or `name:dtype` items; V-Party's dtype where known, else float32
+def parse_columns(items):
+    columns, dtypes = [], {}
+    for item in items:
+        column, _, dtype = item.partition(':')
+        columns.append(column)
+        dtypes[column] = dtype or COLUMN_DTYPES.get(column, 'float32')
+    return columns, dtypes
+
+
+def ingest_command(args):
+    columns, dtypes = parse_columns(args.columns) if args.columns else (USED_COLUMNS, COLUMN_DTYPES)
+    index = partitions.ingest(args.csv, args.out, chunk_rows=args.chunk_rows, columns=columns, dtypes=dtypes)
+    print(f"{index['rows']} rows into {len(index['countries'])} country partitions in {args.out} ({index['seconds']:.1f}s)")
+
+
+def prebuild_command(args):
+    manifest = prebuild.prebuild(args.out, args.csv, args.cache_dir, workers=args.workers)
+    print(f"{len(manifest['countries'])} countries x {len(manifest['variables'])} variables, "
+          f"{manifest['bytes'] / 1e6:.1f} MB in {args.out} ({manifest['seconds']:.1f}s)")
+
+
+def cluster_command(args):
+    result = clusters.cluster(args.csv, args.cache_dir, k_values=args.k, restarts=args.restarts, seed=args.seed, workers=args.workers)
+    print(f"{result['clustered_rows']} of {result['rows']} party-years clustered in {result['seconds']:.1f}s -> {result['path']}")
+    for k, inertia in result['inertia'].items():
+        print(f"k={k:<3} inertia {inertia:.1f}")
+
+
+def trajectories_command(args):
+    result = trajectories.build_trajectories(args.csv, args.cache_dir, workers=args.workers)
+    print(f"Trends and shifts for {result['rows']} rows in {result['blocks']} country blocks ({result['seconds']:.1f}s) -> {result['path']}")
+
+
+def export_command(args):
+    index = DatasetIndex(store.load_dataset(args.csv, args.cache_dir))
+    countries = args.countries or index.countries
+    years = (args.start, args.end) if args.start is not None or args.end is not None else None
+    written = export.export_file(index, args.out, countries, args.variables, years, args.format, args.chunk_rows)
+    print(f"{written / 1e6:.1f} MB of {len(countries)} countries to {args.out}", file=sys.stderr if args.out == '-' else sys.stdout)
+
+
+def serve_command(args):
+    api.serve(args.csv, args.cache_dir, args.host, args.port, cache_bytes=int(args.cache_mb * 1024 * 1024), verbose=args.verbose)
+
+
+def profile_report_command(args):
+    summary = profiling.summarize(profiling.read_records(args.log))
+    print(f"{'stage':<20} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]['p95_ms']):
+        print(f"{name:<20} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vparty')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build-store', help="convert the V-Party CSV into the memory-mapped Arrow store")
+    build_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    build_parser.add_argument('--cache-dir', default=store.STORE_DIR, help="directory holding the Arrow store")
+    build_parser.add_argument('--force', action='store_true', help="rebuild even if the source is unchanged")
+    build_parser.set_defaults(func=build_store_command)
+
+    ingest_parser = subparsers.add_parser('ingest', help="stream the CSV into one Arrow partition per country")
+    ingest_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    ingest_parser.add_argument('--out', default=partitions.PARTITION_DIR, help="output directory")
+    ingest_parser.add_argument('--chunk-rows', type=int, default=partitions.CHUNK_ROWS, help="CSV rows read per chunk")
+    ingest_parser.add_argument('--columns', nargs='+', metavar='NAME[:DTYPE]',
+                               help="columns to keep instead of V-Party's, e.g. for V-Dem files; must include country_name "
+                                    "(dtype: V-Party's if known, else float32; 'category' for names)")
+    ingest_parser.set_defaults(func=ingest_command)
+
+    prebuild_parser = subparsers.add_parser('prebuild', help="prebuild every country x position chart into a static directory")
+    prebuild_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    prebuild_parser.add_argument('--cache-dir', default=store.STORE_DIR, help="directory holding the Arrow store")
+    prebuild_parser.add_argument('--out', default=os.environ.get('VPARTY_PREBUILT_DIR', prebuild.PREBUILT_DIR), help="output directory")
+    prebuild_parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    prebuild_parser.set_defaults(func=prebuild_command)
+
+    cluster_parser = subparsers.add_parser('cluster', help="group all party-years into ideological families with mini-batch k-means")
+    cluster_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    cluster_parser.add_argument('--cache-dir', default=store.STORE_DIR, help="directory holding the Arrow store (results go to its clusters/ subdirectory)")
+    cluster_parser.add_argument('--k', type=int, nargs='+', default=clusters.K_VALUES, help="numbers of families to fit")
+    cluster_parser.add_argument('--restarts', type=int, default=clusters.RESTARTS, help="random restarts per k; the lowest inertia wins")
+    cluster_parser.add_argument('--seed', type=int, default=0)
+    cluster_parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    cluster_parser.set_defaults(func=cluster_command)
+
+    trajectories_parser = subparsers.add_parser('trajectories', help="precompute trends, changes and shifts of every party series")
+    trajectories_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    trajectories_parser.add_argument('--cache-dir', default=store.STORE_DIR, help="directory holding the Arrow store (results go to its trajectories/ subdirectory)")
+    trajectories_parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    trajectories_parser.set_defaults(func=trajectories_command)
+
+    export_parser = subparsers.add_parser('export', help="stream countries, variables and a year range to CSV, Parquet or JSON Lines")
+    export_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    export_parser.add_argument('--cache-dir', default=store.STORE_DIR, help="directory holding the Arrow store")
+    export_parser.add_argument('--countries', nargs='+', help="countries to export (default: all)")
+    export_parser.add_argument('--variables', nargs='+', choices=SCORE_COLUMNS, help="score variables to export (default: all positions)")
+    export_parser.add_argument('--start', type=int, help="first year")
+    export_parser.add_argument('--end', type=int, help="last year")
+    export_parser.add_argument('--format', choices=export.EXPORT_FORMATS, help="output format (default: from the --out extension, else csv)")
+    export_parser.add_argument('--chunk-rows', type=int, default=export.CHUNK_ROWS, help="rows gathered and written per chunk")
+    export_parser.add_argument('--out', default='-', help="output file ('-' for standard output)")
+    export_parser.set_defaults(func=export_command)
+
+    serve_parser = subparsers.add_parser('serve', help="serve countries, series, scatter points and variable metadata as a local JSON/CSV API")
+    serve_parser.add_argument('--csv', default=CSV_FILE_PATH, help="source CSV file")
+    serve_parser.add_argument('--cache-dir', default=store.STORE_DIR, help="directory holding the Arrow store")
+    serve_parser.add_argument('--host', default=api.API_HOST)
+    serve_parser.add_argument('--port', type=int, default=api.API_PORT)
+    serve_parser.add_argument('--cache-mb', type=float, default=api.RESPONSE_CACHE_BYTES / 1024 / 1024, help="byte budget of cached responses")
+    serve_parser.add_argument('--verbose', action='store_true', help="log every request")
+    serve_parser.set_defaults(func=serve_command)
+
+    report_parser = subparsers.add_parser('profile-report', help="p50/p95 rerun latency per stage from a profiler log")
+    report_parser.add_argument('log', nargs='?', default=profiling.PROFILE_LOG, help="JSONL log written with VPARTY_PROFILE")
+    report_parser.set_defaults(func=profile_report_command)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+# Local HTTP API over the dashboard's data, for other tools
+#
+#   GET /countries                      countries with their number of parties and years
+#   GET /variables                      position variables: label, question, coding, categories
+#   GET /series?country=&variable=      scored party-years of one variable (start=, end= years)
+#   GET /scatter?country=&variable=     3D-scatter points (start=, end=, or snapshot= year)
+#   GET /export?countries=&variables=   bulk export (comma-separated, default all; start=, end=)
+#                                       as format=csv, parquet or jsonl, streamed and not cached
+#
+# Answers are JSON (an array of objects) or CSV with format=csv or "Accept: text/csv".
+# Rows come from the same index, year filters and label table as the dashboard. A body is
+# streamed in chunks as it is encoded, then cached by dataset fingerprint and query; the
+# ETag is derived from that key alone, so a matching If-None-Match is a 304 that never
+# touches the data. Run with: python -m vparty serve
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from vparty import store
+from vparty.data import CSV_FILE_PATH
+from vparty.export import EXPORT_MIME_TYPES, export_stream, python_columns
+from vparty.index import DatasetIndex
+from vparty.labels import LABEL_BINS, LabelTable
+from vparty.metadata import coding_map, label_map, question_map
+from vparty.textcache import TextCache
+
+API_HOST = os.environ.get('VPARTY_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('VPARTY_API_PORT', '8502'))
+
+# Byte budget of cached response bodies
+RESPONSE_CACHE_BYTES = int(float(os.environ.get('VPARTY_API_CACHE_MB', '64')) * 1024 * 1024)
+
+# Rows encoded per streamed chunk
+CHUNK_ROWS = 2000
+
+CONTENT_TYPES = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
+
+
+# The dataset, its row index and label table, reloaded when the CSV changes
+class ApiData:
+    def __init__(self, csv_file_path=CSV_FILE_PATH, store_dir=store.STORE_DIR):
+        self.csv_file_path = csv_file_path
+        self.store_dir = store_dir
+        self._stat = None
+        self._lock = threading.Lock()
+
+    # (index, labels, fingerprint) of the current dataset
+    def current(self):
+        stat = store.source_stat(self.csv_file_path)
+        with self._lock:
+            if stat != self._stat:
+                self.fingerprint = store.dataset_fingerprint(self.csv_file_path, self.store_dir)
+                self.index = DatasetIndex(store.read_store(self.store_dir))
+                self.labels = LabelTable(self.index.data)
+                self._stat = stat
+            return self.index, self.labels, self.fingerprint
+
+
+def _country(index, params):
+    country_name = params.get('country')
+    if country_name not in index.country_slices:
+        raise ValueError(f"Unknown country {country_name!r}")
+    return country_name
+
+
+def _variable(params):
+    variable = params.get('variable')
+    if variable not in label_map:
+        raise ValueError(f"Unknown variable {variable!r}, expected one of {list(label_map)}")
+    return variable
+
+
+def _year(params, name):
+    try:
+        return int(params[name]) if name in params else None
+    except ValueError:
+        raise ValueError(f"{name} must be a year, got {params[name]!r}") from None
+
+
+# Rows of one country selected like the dashboard's year slider and snapshot checkbox
+def _positions(index, country_name, params):
+    snapshot = _year(params, 'snapshot')
+    if snapshot is not None:
+        return index.snapshot_rows(country_name, snapshot)
+    first_year, last_year = index.year_bounds(country_name)
+    start, end = _year(params, 'start'), _year(params, 'end')
+    if start is None and end is None:
+        return np.arange(index.country_slices[country_name].start, index.country_slices[country_name].stop)
+    return index.year_range_rows(country_name, first_year if start is None else start, last_year if end is None else end)
+
+
+# Object array holding one list per row (np.array would make a 2D array of equal-length lists)
+def _objects(values):
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
+
+
+# Each endpoint returns the column names and one array per column
+
+def countries_table(index, labels, params):
+    names = index.countries
+    bounds = [index.year_bounds(country_name) for country_name in names]
+    return ['country', 'parties', 'rows', 'first_year', 'last_year'], [
+        np.array(names, dtype=object),
+        np.array([len(index.party_slices[country_name]) for country_name in names]),
+        np.array([index.country_slices[country_name].stop - index.country_slices[country_name].start for country_name in names]),
+        np.array([first for first, _ in bounds]),
+        np.array([last for _, last in bounds]),
+    ]
+
+
+def variables_table(index, labels, params):
+    variables = list(label_map)
+    return ['variable', 'label', 'question', 'coding', 'categories'], [
+        np.array(variables, dtype=object),
+        np.array([label_map[variable] for variable in variables], dtype=object),
+        np.array([question_map.get(variable, '') for variable in variables], dtype=object),
+        _objects([list(coding_map.get(variable, [])) for variable in variables]),
+        _objects([LABEL_BINS[variable][1] for variable in variables]),
+    ]
+
+
+def series_table(index, labels, params):
+    country_name, variable = _country(index, params), _variable(params)
+    positions = _positions(index, country_name, params)
+    positions = positions[~np.isnan(index.data[variable].to_numpy()[positions])]
+    return ['party', 'year', 'score', 'label'], [
+        index.data['v2paenname'].to_numpy()[positions],
+        index.years[positions],
+        index.data[variable].to_numpy()[positions],
+        labels.strings(variable, positions),
+    ]
+
+
+def scatter_table(index, labels, params):
+    country_name, variable = _country(index, params), _variable(params)
+    positions = _positions(index, country_name, params)
+    columns = ['v2pariglef_osp', 'ep_v6_lib_cons', variable]
+    scores = [index.data[column].to_numpy()[positions] for column in columns]
+    drawn = ~np.isnan(np.column_stack(scores)).any(axis=1)
+    positions = positions[drawn]
+    return ['party', 'year', 'economic', 'social', 'score', 'economic_label', 'social_label', 'score_label'], [
+        index.data['v2paenname'].to_numpy()[positions],
+        index.years[positions],
+        *[values[drawn] for values in scores],
+        *[labels.strings(column, positions) for column in columns],
+    ]
+
+
+ENDPOINTS = {
+    '/countries': countries_table,
+    '/variables': variables_table,
+    '/series': series_table,
+    '/scatter': scatter_table,
+}
+
+
+# Plain Python values of rows [start, stop), missing floats as None
+def _chunk_columns(arrays, start, stop):
+    return python_columns([values[start:stop] for values in arrays])
+
+
+# Encoded body of a table as a sequence of text chunks
+def encode_json(names, arrays, chunk_rows=CHUNK_ROWS):
+    rows = len(arrays[0]) if arrays else 0
+    yield '['
+    for start in range(0, rows, chunk_rows):
+        records = (json.dumps(dict(zip(names, row))) for row in zip(*_chunk_columns(arrays, start, start + chunk_rows)))
+        yield (',' if start else '') + ','.join(records)
+    yield ']'
+
+
+def encode_csv(names, arrays, chunk_rows=CHUNK_ROWS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(names)
+    rows = len(arrays[0]) if arrays else 0
+    for start in range(0, rows, chunk_rows):
+        for row in zip(*_chunk_columns(arrays, start, start + chunk_rows)):
+            writer.writerow(['; '.join(value) if isinstance(value, list) else value for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+ENCODERS = {'json': encode_json, 'csv': encode_csv}
+
+
+# ETag of the response to `key` on the dataset with this fingerprint
+def _etag(fingerprint, key):
+    return '"' + hashlib.sha256(json.dumps([fingerprint, *key]).encode()).hexdigest()[:32] + '"'
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 for keep-alive and chunked transfer of uncached bodies
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        output = params.pop('format', None) or ('csv' if 'text/csv' in self.headers.get('Accept', '') else 'json')
+        if url.path.rstrip('/') == '/export':
+            return self._send_export(params, 'csv' if output == 'json' else output)
+        endpoint = ENDPOINTS.get(url.path.rstrip('/') or '/')
+        if endpoint is None:
+            return self._send_error(404, f"Unknown endpoint {url.path!r}, expected one of {list(ENDPOINTS)}")
+        if output not in ENCODERS:
+            return self._send_error(400, f"Unknown format {output!r}, expected one of {list(ENCODERS)}")
+
+        index, labels, fingerprint = self.server.data.current()
+        key = (url.path.rstrip('/'), output, tuple(sorted(params.items())))
+        etag = _etag(fingerprint, key)
+        if self._not_modified(etag):
+            return
+
+        body = self.server.cache.lookup(fingerprint, key)
+        if body is not None:
+            data = body.encode()
+            self._send_headers(CONTENT_TYPES[output], etag, 'hit', length=len(data))
+            self.wfile.write(data)
+            return
+
+        try:
+            names, arrays = endpoint(index, labels, params)
+        except ValueError as error:
+            return self._send_error(400, str(error))
+        self._send_headers(CONTENT_TYPES[output], etag, 'miss')
+        chunks = []
+        for chunk in ENCODERS[output](names, arrays):
+            self._write_chunk(chunk.encode())
+            chunks.append(chunk)
+        self._write_chunk(b'')
+        self.server.cache.store(fingerprint, key, ''.join(chunks))
+
+    # Stream an export of the dataset; too large to keep, so it is written as it is encoded
+    def _send_export(self, params, output):
+        index, _, fingerprint = self.server.data.current()
+        countries = params['countries'].split(',') if params.get('countries') else index.countries
+        variables = params['variables'].split(',') if params.get('variables') else None
+        try:
+            years = (_year(params, 'start'), _year(params, 'end'))
+            chunks = export_stream(index, countries, variables, years if years != (None, None) else None, output)
+        except ValueError as error:
+            return self._send_error(400, str(error))
+        etag = _etag(fingerprint, ('/export', output, tuple(sorted(params.items()))))
+        if self._not_modified(etag):
+            return
+        self._send_headers(EXPORT_MIME_TYPES[output], etag, 'bypass')
+        for chunk in chunks:
+            if chunk:
+                self._write_chunk(chunk)
+        self._write_chunk(b'')
+
+    # Answer 304 if the client already has the response with this ETag
+    def _not_modified(self, etag):
+        if etag not in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    # One chunk of a chunked body; the empty chunk ends it
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def _send_headers(self, content_type, etag, cache, length=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Cache', cache)
+        if length is None:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+    def _send_error(self, status, message):
+        data = json.dumps({'error': message}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', CONTENT_TYPES['json'])
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, data, cache_bytes=RESPONSE_CACHE_BYTES, verbose=False):
+        super().__init__(address, ApiHandler)
+        self.data = data
+        self.cache = TextCache(cache_bytes)
+        self.verbose = verbose
+
+
+# Serve the API until interrupted; the dataset is loaded before the first request
+def serve(csv_file_path=CSV_FILE_PATH, store_dir=store.STORE_DIR, host=API_HOST, port=API_PORT,
+          cache_bytes=RESPONSE_CACHE_BYTES, verbose=False):
+    data = ApiData(csv_file_path, store_dir)
+    data.current()
+    server = ApiServer((host, port), data, cache_bytes, verbose)
+    print(f"Serving the V-Party API on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,198 @@
+# Ideological families: mini-batch k-means over every party-year
+#
+# Party-years are clustered in the standardized score space of the similarity
+# search (missing scores at the column mean). Each (k, restart) pair is fitted
+# in a process pool; the restart with the lowest inertia wins for every k.
+# Assignments and centroids are persisted next to the Arrow store, keyed by the
+# dataset fingerprint and the clustering parameters:
+#   <store>/clusters/<fingerprint>-<params>.npz  - labels_<k> (int8) and centers_<k> per k
+#   <store>/clusters/<fingerprint>-<params>.json - parameters and inertia per k
+# so the dashboard only ever reads them.
+import glob
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+from vparty import pools, store
+from vparty.data import CSV_FILE_PATH
+from vparty.labels import LABEL_BINS, label_codes
+from vparty.similarity import FEATURE_COLUMNS, MIN_SHARED, score_matrix
+
+CLUSTER_DIR = 'clusters'
+K_VALUES = [4, 6, 8, 10]
+RESTARTS = 4
+BATCH_SIZE = 1024
+ITERATIONS = 200
+
+# Party-years with fewer scores than this are left unclustered (label -1)
+MIN_SCORES = MIN_SHARED
+
+
+# Squared distances of every point to every centre, in row chunks to bound memory
+def _nearest(points, centers, chunk_rows=65536):
+    labels = np.empty(len(points), dtype=np.intp)
+    distances = np.empty(len(points), dtype=np.float64)
+    center_norms = (centers ** 2).sum(axis=1)
+    for start in range(0, len(points), chunk_rows):
+        chunk = points[start:start + chunk_rows]
+        squared = (chunk ** 2).sum(axis=1)[:, None] - 2 * chunk @ centers.T + center_norms
+        labels[start:start + chunk_rows] = squared.argmin(axis=1)
+        distances[start:start + chunk_rows] = np.maximum(squared[np.arange(len(chunk)), labels[start:start + chunk_rows]], 0)
+    return labels, distances
+
+
+# k-means++ seeding on a sample of the points
+def _kmeans_plus_plus(points, k, rng):
+    centers = [points[rng.integers(len(points))]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = closest.sum()
+        choice = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centers.append(points[choice])
+        closest = np.minimum(closest, ((points - points[choice]) ** 2).sum(axis=1))
+    return np.array(centers, dtype=np.float64)
+
+
+# Mini-batch k-means (Sculley, 2010): each batch moves its centres towards the batch
+# means with a per-centre learning rate of 1 / (points seen by that centre).
+# Returns the centres and the inertia over all points.
+def minibatch_kmeans(points, k, seed, batch_size=BATCH_SIZE, iterations=ITERATIONS):
+    rng = np.random.default_rng(seed)
+    sample = points[rng.choice(len(points), min(len(points), 10_000), replace=False)].astype(np.float64)
+    centers = _kmeans_plus_plus(sample, k, rng)
+    seen = np.zeros(k)
+    for _ in range(iterations):
+        batch = points[rng.integers(0, len(points), batch_size)].astype(np.float64)
+        nearest, _ = _nearest(batch, centers)
+        counts = np.bincount(nearest, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, nearest, batch)
+        seen += counts
+        moved = counts > 0
+        rate = counts[moved] / seen[moved]
+        centers[moved] += (sums[moved] / counts[moved, None] - centers[moved]) * rate[:, None]
+    _, distances = _nearest(points, centers)
+    return centers, float(distances.sum())
+
+
+# Per-worker feature matrix
+def _load_worker(store_dir):
+    features, present, mean, std = score_matrix(store.read_store(store_dir))
+    valid = present.sum(axis=1) >= MIN_SCORES
+    return {'points': features[valid], 'valid': valid, 'mean': mean, 'std': std}
+
+
+def _fit(k, seed, batch_size, iterations):
+    centers, inertia = minibatch_kmeans(pools.state('cluster')['points'], k, seed, batch_size, iterations)
+    return k, seed, centers, inertia
+
+
+def _cluster_dir(store_dir):
+    return os.path.join(store_dir, CLUSTER_DIR)
+
+
+# Fit every k with `restarts` seeds in a process pool and persist the best fit per k
+def cluster(csv_file_path=CSV_FILE_PATH, store_dir=store.STORE_DIR, k_values=K_VALUES, restarts=RESTARTS,
+            seed=0, batch_size=BATCH_SIZE, iterations=ITERATIONS, workers=None):
+    started = time.time()
+    meta = store.ensure_store(csv_file_path, store_dir)
+    params = {
+        'features': FEATURE_COLUMNS,
+        'min_scores': MIN_SCORES,
+        'k_values': sorted(k_values),
+        'restarts': restarts,
+        'seed': seed,
+        'batch_size': batch_size,
+        'iterations': iterations,
+    }
+    worker = pools.load_state('cluster', _load_worker, store_dir)
+
+    best = {}
+    with pools.worker_pool('cluster', _load_worker, store_dir, workers=workers) as pool:
+        futures = [pool.submit(_fit, k, seed * 1000 + restart, batch_size, iterations)
+                   for k in params['k_values'] for restart in range(restarts)]
+        for future in futures:
+            k, run_seed, centers, inertia = future.result()
+            if k not in best or inertia < best[k][1]:
+                best[k] = (centers, inertia, run_seed)
+
+    # Label every party-year with its nearest centre, numbering families from economic
+    # left to right; centres are stored in score units
+    arrays = {}
+    for k, (centers, _, _) in best.items():
+        centers = centers[np.argsort(centers[:, FEATURE_COLUMNS.index('v2pariglef_osp')])]
+        labels = np.full(len(worker['valid']), -1, dtype=np.int8)
+        labels[worker['valid']] = _nearest(worker['points'], centers)[0]
+        arrays[f"labels_{k}"] = labels
+        arrays[f"centers_{k}"] = (centers * worker['std'] + worker['mean']).astype(np.float32)
+
+    stem = os.path.join(_cluster_dir(store_dir), f"{meta['sha256'][:16]}-{store.params_id(params)}")
+    os.makedirs(_cluster_dir(store_dir), exist_ok=True)
+
+    def write_arrays(path):
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        with open(path, 'wb') as f:
+            f.write(buffer.getvalue())
+    store.write_atomic(f"{stem}.npz", write_arrays)
+
+    result = {
+        'fingerprint': meta['sha256'],
+        'params': params,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'inertia': {str(k): best[k][1] for k in params['k_values']},
+        'seeds': {str(k): best[k][2] for k in params['k_values']},
+        'rows': int(len(worker['valid'])),
+        'clustered_rows': int(worker['valid'].sum()),
+    }
+
+    def write_result(path):
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+    store.write_atomic(f"{stem}.json", write_result)
+    result['path'] = f"{stem}.npz"
+    result['seconds'] = time.time() - started
+    return result
+
+
+# Path of the most recent clustering of the dataset with this fingerprint, if any
+def find_clusters(store_dir, fingerprint):
+    paths = glob.glob(os.path.join(_cluster_dir(store_dir), f"{fingerprint[:16]}-*.json"))
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)[:-len('.json')]
+
+
+# Read-only access to one persisted clustering
+class Clustering:
+    def __init__(self, stem):
+        with open(f"{stem}.json") as f:
+            self.meta = json.load(f)
+        # Identifies these results in figure cache keys, also across reruns with the same parameters
+        self.key = f"{os.path.basename(stem)}@{self.meta['created']}"
+        with np.load(f"{stem}.npz") as arrays:
+            self._arrays = {name: arrays[name] for name in arrays.files}
+        self.k_values = self.meta['params']['k_values']
+
+    # Family of every party-year (-1 for unclustered) in store row order
+    def labels(self, k):
+        return self._arrays[f"labels_{k}"]
+
+    # Centroids in score units, one column per FEATURE_COLUMNS entry
+    def centers(self, k):
+        return self._arrays[f"centers_{k}"]
+
+    # "n. <economic label>, <social label>" of each family's centroid
+    def family_names(self, k):
+        centers = self.centers(k)
+        names = []
+        for i, center in enumerate(centers):
+            parts = []
+            for column in ['v2pariglef_osp', 'ep_v6_lib_cons']:
+                code = label_codes([center[FEATURE_COLUMNS.index(column)]], column)[0]
+                parts.append(LABEL_BINS[column][1][code])
+            names.append(f"{i + 1}. {', '.join(parts)}")
+        return names
@@ -0,0 +1,189 @@
+# Multi-country comparison charts
+#
+# The line view draws one WebGL (Scattergl) trace per country, with each party's
+# series separated by a NaN gap, and downsamples long series with LTTB so the
+# whole chart stays within a point budget. The 3D view falls back to voxel
+# counts once there are more points than the browser can comfortably draw.
+import os
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from vparty.figures import discrete_colorscale, scatter_layout
+from vparty.index import group_runs
+from vparty.metadata import label_map
+
+# Maximum number of points drawn by the comparison line chart
+LINE_POINT_BUDGET = int(os.environ.get('VPARTY_LINE_POINT_BUDGET', '20000'))
+
+# Above this many points the 3D view switches to voxel aggregation
+SCATTER_POINT_LIMIT = int(os.environ.get('VPARTY_SCATTER_POINT_LIMIT', '5000'))
+
+# Voxels per axis for the aggregated 3D view
+VOXEL_BINS = 20
+
+# Country colours cycle through a palette with more distinct colours than Plotly's
+COUNTRY_PALETTE = px.colors.qualitative.Dark24
+
+
+# Largest-Triangle-Three-Buckets downsampling: indices of `threshold` points of
+# (x, y) that keep the visual shape of the series, first and last point included
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        stop = int((i + 1) * every) + 1
+        next_stop = min(int((i + 2) * every) + 1, n)
+        # Average of the next bucket (the last bucket uses the final point)
+        avg_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        avg_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# Share a point budget between series in proportion to their length
+def point_budgets(lengths, budget):
+    lengths = np.asarray(lengths)
+    total = lengths.sum()
+    if total <= budget:
+        return lengths
+    return np.minimum(lengths, np.maximum(3, (lengths * budget) // total))
+
+
+# (country, colour) legend entries matching the comparison line chart
+def comparison_legend_entries(country_names):
+    return [(country, COUNTRY_PALETTE[i % len(COUNTRY_PALETTE)]) for i, country in enumerate(sorted(country_names))]
+
+
+# WebGL line chart of one position variable for every party of several countries
+def comparison_line_figure(rows, identity_score, point_budget=LINE_POINT_BUDGET):
+    country_codes = rows['country_name'].cat.codes.to_numpy()
+    party_codes = rows['v2paenname'].cat.codes.to_numpy()
+    country_names = rows['country_name'].cat.categories
+    party_names = rows['v2paenname'].cat.categories
+    years = rows['year'].to_numpy(dtype=np.float64)
+    values = rows[identity_score].to_numpy(dtype=np.float64)
+
+    # Each (country, party) run minus its missing scores is one series
+    starts, stops = group_runs(country_codes, party_codes)
+    series = []
+    for start, stop in zip(starts, stops):
+        positions = start + np.flatnonzero(~np.isnan(values[start:stop]))
+        if len(positions):
+            series.append((country_codes[start], party_codes[start], positions))
+    budgets = point_budgets([len(positions) for _, _, positions in series], point_budget)
+
+    # Concatenate the (downsampled) series of each country, separated by NaN gaps
+    traces = {}
+    for (country_code, party_code, positions), budget in zip(series, budgets):
+        positions = positions[lttb(years[positions], values[positions], int(budget))]
+        x, y, names = traces.setdefault(country_code, ([], [], []))
+        x += [years[positions], [np.nan]]
+        y += [values[positions], [np.nan]]
+        names += [np.full(len(positions) + 1, party_names[party_code] if party_code >= 0 else '', dtype=object)]
+
+    # Colours follow the sorted countries of `rows`, as in comparison_legend_entries
+    colors = {code: COUNTRY_PALETTE[i % len(COUNTRY_PALETTE)] for i, code in enumerate(np.unique(country_codes))}
+    fig = go.Figure()
+    for country_code, (x, y, names) in traces.items():
+        fig.add_trace(go.Scattergl(
+            x=np.concatenate(x),
+            y=np.concatenate(y),
+            customdata=np.concatenate(names),
+            name=str(country_names[country_code]),
+            mode='lines',
+            line=dict(color=colors[country_code], width=1),
+            hovertemplate="<b>%{customdata}</b><br>Year: %{x}<br>Score: %{y:.2f}",
+        ))
+    fig.update_layout(xaxis_title='Year', yaxis_title=label_map[identity_score], legend_title_text='Country')
+    return fig
+
+
+# Points with all three coordinates present
+def _scatter_points(rows, identity_score):
+    points = np.column_stack([
+        rows['v2pariglef_osp'].to_numpy(dtype=np.float64),
+        rows['ep_v6_lib_cons'].to_numpy(dtype=np.float64),
+        rows[identity_score].to_numpy(dtype=np.float64),
+    ])
+    return points, ~np.isnan(points).any(axis=1)
+
+
+# Count points per voxel of a bins^3 grid; returns the occupied voxel centres and counts
+def voxel_counts(points, bins=VOXEL_BINS):
+    low = points.min(axis=0)
+    width = np.maximum(points.max(axis=0) - low, 1e-9) / bins
+    cells = np.clip(((points - low) / width).astype(np.intp), 0, bins - 1)
+    flat = (cells[:, 0] * bins + cells[:, 1]) * bins + cells[:, 2]
+    counts = np.bincount(flat, minlength=bins ** 3)
+    occupied = np.flatnonzero(counts)
+    centres = np.column_stack(np.unravel_index(occupied, (bins, bins, bins))) * width + low + width / 2
+    return centres, counts[occupied]
+
+
+# Name of each row of a categorical column, '' where missing
+def _row_names(values):
+    codes = values.cat.codes.to_numpy()
+    names = values.cat.categories.to_numpy(dtype=object)[codes]
+    names[codes < 0] = ''
+    return names
+
+
+# 3D scatter for several countries: raw points coloured by country up to the point
+# limit, voxel density above it
+def comparison_scatter_figure(rows, identity_score, point_limit=SCATTER_POINT_LIMIT, bins=VOXEL_BINS):
+    points, valid = _scatter_points(rows, identity_score)
+    if valid.sum() <= point_limit:
+        countries = rows['country_name'].cat.remove_unused_categories()
+        customdata = np.column_stack([
+            _row_names(countries),
+            _row_names(rows['v2paenname']),
+            rows['year'].to_numpy(),
+        ])[valid]
+        n_countries = len(countries.cat.categories)
+        trace = go.Scatter3d(
+            x=points[valid, 0], y=points[valid, 1], z=points[valid, 2],
+            customdata=customdata,
+            hovertemplate=(" <b>Party:</b> %{customdata[1]} (%{customdata[0]}, %{customdata[2]})"
+                           "<br><b>Economic:</b> %{x:.2f}<br><b>Social:</b> %{y:.2f}"
+                           f"<br><b>{label_map[identity_score]}:</b> %{{z:.2f}} <extra></extra>"),
+            mode='markers',
+            marker=dict(
+                size=4,
+                color=countries.cat.codes.to_numpy()[valid] + 0.5,
+                colorscale=discrete_colorscale([COUNTRY_PALETTE[i % len(COUNTRY_PALETTE)] for i in range(n_countries)]),
+                cmin=0,
+                cmax=n_countries,
+                opacity=0.6,
+            ),
+        )
+    else:
+        centres, counts = voxel_counts(points[valid], bins)
+        trace = go.Scatter3d(
+            x=centres[:, 0], y=centres[:, 1], z=centres[:, 2],
+            customdata=counts,
+            hovertemplate=(" <b>%{customdata} party-years</b><br><b>Economic:</b> ~%{x:.1f}<br><b>Social:</b> ~%{y:.1f}"
+                           f"<br><b>{label_map[identity_score]}:</b> ~%{{z:.1f}} <extra></extra>"),
+            mode='markers',
+            marker=dict(
+                size=3 + 12 * np.sqrt(counts / counts.max()),
+                color=counts,
+                colorscale='Viridis',
+                colorbar=dict(title='Party-years'),
+                opacity=0.7,
+            ),
+        )
+    fig_3d = go.Figure(data=[trace])
+    scatter_layout(fig_3d, identity_score)
+    return fig_3d
@@ -0,0 +1,27 @@
+# Loading helpers for the V-Party dataset
+import pandas as pd
+
+from vparty.metadata import label_map
+
+CSV_FILE_PATH = 'V-Dem-CPD-Party-V2.csv'
+
+# Columns the dashboard actually uses, grouped by role
+ID_COLUMNS = ['country_name', 'v2paenname', 'year']
+IDEOLOGY_COLUMNS = ['v2pariglef_osp', 'ep_v6_lib_cons']
+POSITION_COLUMNS = list(label_map.keys())
+SCORE_COLUMNS = IDEOLOGY_COLUMNS + POSITION_COLUMNS
+USED_COLUMNS = ID_COLUMNS + SCORE_COLUMNS
+
+# Compact dtypes: names repeat thousands of times, scores only need float32
+# precision on their 0-4 / 0-10 scales and years fit comfortably in int16
+COLUMN_DTYPES = {
+    'country_name': 'category',
+    'v2paenname': 'category',
+    'year': 'int16',
+    **{column: 'float32' for column in SCORE_COLUMNS},
+}
+
+
+# Read only the used columns of the V-Party CSV with compact dtypes
+def read_dataset(csv_file_path=CSV_FILE_PATH):
+    return pd.read_csv(csv_file_path, usecols=USED_COLUMNS, dtype=COLUMN_DTYPES)[USED_COLUMNS]
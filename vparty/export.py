@@ -0,0 +1,183 @@
+# Streaming export of dataset slices to CSV, Parquet and JSON Lines
+#
+# A selection is a list of countries, score variables and an optional year range.
+# Its rows are gathered from the index in chunks of at most CHUNK_ROWS positions
+# (small countries share a chunk, large ones are split), each chunk becomes one
+# Arrow record batch, and the writer's output is handed on after every batch. So
+# the whole dataset exports in memory bounded by one chunk, and the first bytes
+# are ready after the first chunk.
+import json
+import os
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from vparty import store
+from vparty.data import ID_COLUMNS, POSITION_COLUMNS, SCORE_COLUMNS
+
+EXPORT_FORMATS = ['csv', 'parquet', 'jsonl']
+CHUNK_ROWS = 50_000
+
+EXPORT_MIME_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet', 'jsonl': 'application/x-ndjson'}
+
+
+# Check a requested variable list against the exportable score columns
+def export_variables(variables=None):
+    variables = list(variables) if variables else POSITION_COLUMNS
+    unknown = [variable for variable in variables if variable not in SCORE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown variables {unknown}, expected some of {SCORE_COLUMNS}")
+    return variables
+
+
+# Row positions of the selection in chunks of at most `chunk_rows`, in index order.
+# `years` is (start, end) with None for an open end, or None for all years.
+def export_positions(index, countries, years=None, chunk_rows=CHUNK_ROWS):
+    pending, pending_rows = [], 0
+    for country_name in countries:
+        rows = index.country_slices[country_name]
+        if years:
+            first_year, last_year = index.year_bounds(country_name)
+            positions = index.year_range_rows(country_name, first_year if years[0] is None else years[0], last_year if years[1] is None else years[1])
+        else:
+            positions = np.arange(rows.start, rows.stop)
+        while len(positions):
+            take = positions[:chunk_rows - pending_rows]
+            positions = positions[len(take):]
+            pending.append(take)
+            pending_rows += len(take)
+            if pending_rows == chunk_rows:
+                yield np.concatenate(pending)
+                pending, pending_rows = [], 0
+    if pending_rows:
+        yield np.concatenate(pending)
+
+
+# Columns of the rows at `positions`: names as strings (None where missing), year and the scores as stored
+def export_columns(index, variables, positions):
+    columns = {}
+    for column in ID_COLUMNS + variables:
+        values = index.data[column]
+        if values.dtype == 'category':
+            codes = values.cat.codes.to_numpy()[positions]
+            names = values.cat.categories.to_numpy(dtype=object)[codes]
+            names[codes < 0] = None
+            columns[column] = names
+        else:
+            columns[column] = values.to_numpy()[positions]
+    return columns
+
+
+# Arrow schema of an export: names as strings, the other columns with their stored types
+def export_schema(index, variables):
+    return pa.schema([
+        pa.field(column, pa.string() if index.data[column].dtype == 'category' else pa.from_numpy_dtype(index.data[column].dtype))
+        for column in ID_COLUMNS + variables
+    ])
+
+
+def _record_batch(columns, schema):
+    return pa.record_batch([pa.array(values, type=field.type, from_pandas=True) for values, field in zip(columns.values(), schema)], schema=schema)
+
+
+# Plain Python values of `arrays`, missing floats as None. float32 scores are
+# rounded to the 6 decimals they hold, not printed with float64 noise digits.
+def python_columns(arrays):
+    columns = []
+    for values in arrays:
+        if values.dtype == np.float32:
+            values = values.astype(np.float64).round(6)
+        if values.dtype.kind == 'f':
+            columns.append([None if value != value else value for value in values.tolist()])
+        else:
+            columns.append(values.tolist())
+    return columns
+
+
+# File-like object collecting what a pyarrow writer writes until it is drained
+class _ChunkSink:
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# The export of a selection as an iterator of byte chunks, one (or more) per row chunk.
+# The selection is checked here, before the first chunk is asked for.
+def export_stream(index, countries, variables=None, years=None, output='csv', chunk_rows=CHUNK_ROWS):
+    if output not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {output!r}, expected one of {EXPORT_FORMATS}")
+    variables = export_variables(variables)
+    unknown = [country_name for country_name in countries if country_name not in index.country_slices]
+    if unknown:
+        raise ValueError(f"Unknown countries {unknown}")
+    return _export_chunks(index, countries, variables, years, output, chunk_rows)
+
+
+def _export_chunks(index, countries, variables, years, output, chunk_rows):
+    if output == 'jsonl':
+        for positions in export_positions(index, countries, years, chunk_rows):
+            columns = export_columns(index, variables, positions)
+            names = list(columns)
+            yield ''.join(json.dumps(dict(zip(names, row))) + '\n' for row in zip(*python_columns(columns.values()))).encode()
+        return
+
+    sink = _ChunkSink()
+    schema = export_schema(index, variables)
+    writer = pacsv.CSVWriter(sink, schema) if output == 'csv' else pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for positions in export_positions(index, countries, years, chunk_rows):
+            writer.write_batch(_record_batch(export_columns(index, variables, positions), schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# The whole export of a (small) selection as bytes, e.g. for a download button
+def export_bytes(index, countries, variables=None, years=None, output='csv'):
+    return b''.join(export_stream(index, countries, variables, years, output))
+
+
+# Write an export to `path` ('-' for standard output); returns the bytes written
+def export_file(index, path, countries, variables=None, years=None, output=None, chunk_rows=CHUNK_ROWS):
+    output = output or os.path.splitext(path)[1].lstrip('.') or 'csv'
+    chunks = export_stream(index, countries, variables, years, output, chunk_rows)
+    written = 0
+    if path == '-':
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+            written += len(chunk)
+        sys.stdout.buffer.flush()
+        return written
+
+    def write(tmp_path):
+        nonlocal written
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+    store.write_atomic(path, write)
+    return written
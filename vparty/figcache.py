@@ -0,0 +1,31 @@
+# Process-wide LRU cache of built figures, stored as serialized plotly JSON
+import json
+import os
+
+import plotly.graph_objects as go
+
+from vparty.textcache import TextCache
+
+# Serialize one figure now, while this module is imported: plotly imports its JSON
+# engine (orjson) on first use, and threads making that first call together can
+# see the module half-initialized. Imports are serialized, so this runs once.
+go.Figure().to_json()
+
+# Default byte budget for cached figure JSON
+FIGURE_CACHE_BYTES = int(float(os.environ.get('VPARTY_FIGURE_CACHE_MB', '64')) * 1024 * 1024)
+
+
+# Rebuild a figure from a dict decoded from cached JSON. The JSON was written by
+# plotly from an already validated figure, so validation is skipped (it costs ~10x the parse).
+def figure_from_dict(figure_dict):
+    return go.Figure(figure_dict, _validate=False)
+
+
+def figure_from_json(figure_json):
+    return figure_from_dict(json.loads(figure_json))
+
+
+# Text cache of the dashboard's figure and legend JSON, with its own byte budget
+class FigureCache(TextCache):
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        super().__init__(max_bytes)
@@ -0,0 +1,230 @@
+# Plotly figure construction for the dashboard
+import html
+import os
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from vparty.metadata import label_map
+from vparty.profiling import stage
+
+# How the 3D scatter carries its hover information:
+#   'customdata' - party and category labels as customdata columns, a single
+#                  hovertemplate and colours mapped from party codes (compact, default)
+#   'text'       - one trace with a full HTML string and colour per point (legacy)
+HOVER_MODES = ['customdata', 'text']
+HOVER_MODE = os.environ.get('VPARTY_HOVER_MODE', 'customdata')
+
+# Colours of ideological families; unclustered party-years are grey
+FAMILY_PALETTE = px.colors.qualitative.Bold
+UNCLUSTERED_COLOR = 'lightgrey'
+
+
+# Colour of each party, cycling through the plotly qualitative palette
+def party_color_map(party_options):
+    return {party: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, party in enumerate(party_options)}
+
+
+# Colours of every party in every country, assigned once from the sorted party lists
+# so a party keeps its colour across reruns, sessions and processes
+def country_party_colors(index):
+    return {country: party_color_map(index.parties(country)) for country in index.countries}
+
+
+# (party, colour) legend entries for the parties with at least one score for the
+# variable, from a single groupby over the country's rows
+def legend_entries(rows, identity_score, party_colors):
+    has_score = rows[identity_score].notna().groupby(rows['v2paenname'], observed=True).any()
+    return [(party, party_colors[party]) for party in has_score.index[has_score.to_numpy()]]
+
+
+# The whole legend as one HTML block
+def legend_html(entries):
+    return "".join(
+        f"<div style='display: flex; align-items: center;'><div style='background-color: {color}; width: 20px; height: 10px; margin-right: 5px;'></div> {html.escape(str(party))}</div>"
+        for party, color in entries
+    )
+
+
+# Line graph of one position variable over time, one line per party. The x-axis
+# spans `years` = (start, end) when given, else the years of `rows`.
+def line_figure(rows, identity_score, party_colors, years=None):
+    with stage('px_line'):
+        fig = px.line(rows, x='year', y=identity_score, color='v2paenname', color_discrete_map=party_colors, labels={'year': 'Year', identity_score: label_map[identity_score]})
+
+    # Set a custom range for the x-axis
+    min_year, max_year = years if years is not None else (rows['year'].min(), rows['year'].max())
+    fig.update_layout(xaxis=dict(range=[min_year, max_year]))
+
+    # Remove the legend from the graph
+    fig.update_traces(showlegend=False)
+    return fig
+
+
+# Add a dotted trend line per party and mark its flagged shifts on a line figure.
+# `trend` and `shifts` are the trajectory columns of `rows`.
+def add_trend_overlay(fig, rows, identity_score, party_colors, trend, shifts):
+    parties = rows['v2paenname'].cat
+    years = rows['year'].to_numpy()
+    values = rows[identity_score].to_numpy()
+    codes = parties.codes.to_numpy()
+    for code, party in enumerate(parties.categories):
+        party_rows = np.flatnonzero((codes == code) & ~np.isnan(trend))
+        if len(party_rows) == 0:
+            continue
+        fig.add_scatter(x=years[party_rows], y=trend[party_rows], mode='lines', name=f"{party} (trend)",
+                        line=dict(color=party_colors[party], dash='dot', width=1.5), hoverinfo='skip', showlegend=False)
+        shift_rows = party_rows[shifts[party_rows]]
+        if len(shift_rows):
+            fig.add_scatter(x=years[shift_rows], y=values[shift_rows], mode='markers', name=f"{party} (shift)",
+                            marker=dict(color=party_colors[party], symbol='diamond', size=10, line=dict(color='black', width=1)),
+                            hovertemplate=f"<b>{html.escape(str(party))}</b><br>Shift in %{{x}}: %{{y:.2f}}<extra></extra>", showlegend=False)
+    return fig
+
+
+def _text_traces(rows, identity_score, party_colors, labels, row_slice):
+    # Gather the precomputed category labels of these rows to build the hover text
+    with stage('hover_text'):
+        hover_text = ("<b>Party:</b> " + rows['v2paenname'].astype(str).to_numpy(dtype=object)
+                      + "<br><b>Economic Position:</b> " + labels.strings('v2pariglef_osp', row_slice)
+                      + "<br><b>Social Position:</b> " + labels.strings('ep_v6_lib_cons', row_slice)
+                      + f"<br><b>{label_map[identity_score]}:</b> " + labels.strings(identity_score, row_slice))
+    return [go.Scatter3d(
+        x=rows['v2pariglef_osp'],
+        y=rows['ep_v6_lib_cons'],
+        z=rows[identity_score],
+        text=hover_text,
+        hovertemplate=' %{text} <extra></extra>',  # remove X, Y, and Z labels
+        mode='markers',
+        marker=dict(
+            size=8,
+            color=[party_colors[party] for party in rows['v2paenname']],  # set color to the party color from party_colors
+            colorscale='Viridis',  # choose a colorscale
+            opacity=0.8
+        )
+    )]
+
+
+# Stepped colorscale mapping integer code i (drawn at i + 0.5) to colors[i]
+def discrete_colorscale(colors):
+    n = len(colors)
+    scale = []
+    for i, color in enumerate(colors):
+        scale += [[i / n, color], [(i + 1) / n, color]]
+    return scale
+
+
+def _customdata_traces(rows, identity_score, party_colors, labels, row_slice):
+    # Party name and category labels of every row as customdata columns
+    parties = rows['v2paenname'].cat
+    # A year range without rows has no parties, and an empty colorscale is invalid
+    if len(rows) == 0:
+        return []
+    with stage('hover_text'):
+        customdata = np.column_stack([
+            parties.categories.to_numpy(dtype=object)[parties.codes.to_numpy()],
+            labels.strings('v2pariglef_osp', row_slice),
+            labels.strings('ep_v6_lib_cons', row_slice),
+            labels.strings(identity_score, row_slice),
+        ])
+    return [go.Scatter3d(
+        x=rows['v2pariglef_osp'],
+        y=rows['ep_v6_lib_cons'],
+        z=rows[identity_score],
+        customdata=customdata,
+        hovertemplate=(" <b>Party:</b> %{customdata[0]}<br><b>Economic Position:</b> %{customdata[1]}"
+                       "<br><b>Social Position:</b> %{customdata[2]}"
+                       f"<br><b>{label_map[identity_score]}:</b> %{{customdata[3]}} <extra></extra>"),
+        mode='markers',
+        marker=dict(
+            size=8,
+            # Colour by party code through a stepped colorscale instead of a per-point colour list
+            color=parties.codes.to_numpy() + 0.5,
+            colorscale=discrete_colorscale([party_colors[party] for party in parties.categories]),
+            cmin=0,
+            cmax=len(parties.categories),
+            opacity=0.8
+        )
+    )]
+
+
+# 3D scatter of economic and social ideology against one position variable.
+# `row_slice` (a slice or an array of positions) locates `rows` in the label table, e.g. index.country_slices[country].
+def scatter_figure(rows, identity_score, party_colors, labels, row_slice, hover_mode=HOVER_MODE):
+    if hover_mode == 'text':
+        traces = _text_traces(rows, identity_score, party_colors, labels, row_slice)
+    elif hover_mode == 'customdata':
+        traces = _customdata_traces(rows, identity_score, party_colors, labels, row_slice)
+    else:
+        raise ValueError(f"Unknown hover mode {hover_mode!r}, expected one of {HOVER_MODES}")
+    with stage('go_figure'):
+        fig_3d = go.Figure(data=traces)
+        scatter_layout(fig_3d, identity_score)
+    return fig_3d
+
+
+# (family, colour) legend entries for a clustering with these family names
+def family_legend_entries(family_names):
+    return [(name, FAMILY_PALETTE[i % len(FAMILY_PALETTE)]) for i, name in enumerate(family_names)]
+
+
+# 3D scatter coloured by ideological family instead of party. `families` holds the
+# family of each row (-1 for unclustered) and `family_names` the name of each family.
+def family_scatter_figure(rows, identity_score, families, family_names, labels, row_slice):
+    parties = rows['v2paenname'].cat
+    names = np.array(["Unclustered"] + list(family_names), dtype=object)
+    if len(rows) == 0:
+        with stage('go_figure'):
+            fig_3d = go.Figure()
+            scatter_layout(fig_3d, identity_score)
+        return fig_3d
+    with stage('hover_text'):
+        customdata = np.column_stack([
+            parties.categories.to_numpy(dtype=object)[parties.codes.to_numpy()],
+            names[families + 1],
+            labels.strings('v2pariglef_osp', row_slice),
+            labels.strings('ep_v6_lib_cons', row_slice),
+            labels.strings(identity_score, row_slice),
+        ])
+    colors = [UNCLUSTERED_COLOR] + [color for _, color in family_legend_entries(family_names)]
+    trace = go.Scatter3d(
+        x=rows['v2pariglef_osp'],
+        y=rows['ep_v6_lib_cons'],
+        z=rows[identity_score],
+        customdata=customdata,
+        hovertemplate=(" <b>Party:</b> %{customdata[0]}<br><b>Family:</b> %{customdata[1]}"
+                       "<br><b>Economic Position:</b> %{customdata[2]}<br><b>Social Position:</b> %{customdata[3]}"
+                       f"<br><b>{label_map[identity_score]}:</b> %{{customdata[4]}} <extra></extra>"),
+        mode='markers',
+        marker=dict(
+            size=8,
+            color=families + 1.5,
+            colorscale=discrete_colorscale(colors),
+            cmin=0,
+            cmax=len(colors),
+            opacity=0.8
+        )
+    )
+    with stage('go_figure'):
+        fig_3d = go.Figure(data=[trace])
+        scatter_layout(fig_3d, identity_score)
+    return fig_3d
+
+
+# Axes and frame shared by the 3D scatter plots
+def scatter_layout(fig_3d, identity_score):
+    # Layout configuration for the 3D scatter plot
+    fig_3d.update_layout(scene=dict(
+        xaxis_title='Economic Left-Right Scale',
+        yaxis_title='Social Liberalism-Conservatism Scale',
+        zaxis_title=label_map[identity_score],
+        xaxis=dict(title=dict(font=dict(size=12)), range=[6, 0]),  # reverse the range
+        yaxis=dict(title=dict(font=dict(size=12))),
+        zaxis=dict(title=dict(font=dict(size=12))),
+    ),
+    margin=dict(l=0, r=0, b=0, t=0))
+
+    # Configuring the frame
+    fig_3d.update_layout(scene_aspectmode='cube',
+                        scene_aspectratio=dict(x=1, y=1, z=0.8))
@@ -0,0 +1,120 @@
+# Row index over the dataset sorted by (country, party, year)
+#
+# Once the rows are sorted, every country and every party within a country is a
+# contiguous run, so selecting one is a positional slice instead of a mask scan.
+# Year selections are binary searches: a (country, year) ordering of the rows
+# answers year ranges, and (party run, year) keys answer "latest row per party
+# at or before a year" with one searchsorted over all parties of a country.
+import numpy as np
+
+
+# Sort categories alphabetically and rows by (country, party, year).
+# Data that is already in that order (e.g. read back from the store) is returned as is.
+def sort_dataset(data):
+    for column in ['country_name', 'v2paenname']:
+        categories = data[column].cat.categories
+        if not categories.is_monotonic_increasing:
+            data = data.assign(**{column: data[column].cat.reorder_categories(categories.sort_values())})
+
+    country_codes = data['country_name'].cat.codes.to_numpy()
+    party_codes = data['v2paenname'].cat.codes.to_numpy()
+    years = data['year'].to_numpy()
+    order = np.lexsort((years, party_codes, country_codes))
+    if np.array_equal(order, np.arange(len(order))):
+        return data
+    return data.take(order).reset_index(drop=True)
+
+
+# Start/stop positions of the runs of equal values in a sorted key
+def group_runs(*keys):
+    change = np.zeros(len(keys[0]), dtype=bool)
+    change[:1] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(change)
+    stops = np.append(starts[1:], len(keys[0]))
+    return starts, stops
+
+
+class DatasetIndex:
+    def __init__(self, data):
+        self.data = sort_dataset(data)
+        country_codes = self.data['country_name'].cat.codes.to_numpy()
+        party_codes = self.data['v2paenname'].cat.codes.to_numpy()
+        country_names = self.data['country_name'].cat.categories
+        party_names = self.data['v2paenname'].cat.categories
+
+        # Country -> slice of rows; rows without a country (code -1) are left out
+        self.country_slices = {}
+        for start, stop in zip(*group_runs(country_codes)):
+            if country_codes[start] >= 0:
+                self.country_slices[country_names[country_codes[start]]] = slice(int(start), int(stop))
+
+        # Country -> party -> slice of rows, in the same sorted order
+        self.party_slices = {country: {} for country in self.country_slices}
+        for start, stop in zip(*group_runs(country_codes, party_codes)):
+            if country_codes[start] >= 0 and party_codes[start] >= 0:
+                country = country_names[country_codes[start]]
+                self.party_slices[country][party_names[party_codes[start]]] = slice(int(start), int(stop))
+
+        # Sorted list of countries for the selectbox
+        self.countries = list(self.country_slices)
+
+        # Row positions ordered by (country, year, party) and their years; each country
+        # occupies the same range here as in the data, with its years ascending
+        self.years = self.data['year'].to_numpy()
+        self.year_order = np.lexsort((party_codes, self.years, country_codes))
+        self.sorted_years = self.years[self.year_order]
+
+        # Ascending key run * span + year offset of every row, where run numbers the
+        # (country, party) runs; each country's runs are a contiguous range
+        run_starts, run_stops = group_runs(country_codes, party_codes)
+        self.first_year = int(self.years.min()) if len(self.years) else 0
+        self.year_span = int(self.years.max()) - self.first_year + 1 if len(self.years) else 1
+        self.run_keys = np.repeat(np.arange(len(run_starts), dtype=np.int64), run_stops - run_starts) * self.year_span + (self.years - self.first_year)
+        self.country_runs = {}
+        for country, rows in self.country_slices.items():
+            self.country_runs[country] = (int(np.searchsorted(run_starts, rows.start)), int(np.searchsorted(run_starts, rows.stop)))
+
+    # Rows of one country, with the party categories trimmed to the parties present there
+    def country_frame(self, country_name):
+        rows = self.data.iloc[self.country_slices[country_name]]
+        return rows.assign(v2paenname=rows['v2paenname'].cat.remove_unused_categories())
+
+    # Rows of several countries in index order; all countries is the full frame, uncopied
+    def countries_frame(self, country_names):
+        if set(country_names) >= set(self.countries):
+            return self.data
+        slices = sorted((self.country_slices[country] for country in country_names), key=lambda rows: rows.start)
+        return self.data.take(np.concatenate([np.arange(rows.start, rows.stop) for rows in slices]))
+
+    # First and last year of one country
+    def year_bounds(self, country_name):
+        rows = self.country_slices[country_name]
+        return int(self.sorted_years[rows.start]), int(self.sorted_years[rows.stop - 1])
+
+    # Positions (ascending) of one country's rows with start_year <= year <= end_year
+    def year_range_rows(self, country_name, start_year, end_year):
+        rows = self.country_slices[country_name]
+        years = self.sorted_years[rows]
+        low = rows.start + np.searchsorted(years, start_year, side='left')
+        high = rows.start + np.searchsorted(years, end_year, side='right')
+        return np.sort(self.year_order[low:high])
+
+    # Positions of each party's latest row at or before `year` in one country
+    def snapshot_rows(self, country_name, year):
+        first_run, stop_run = self.country_runs[country_name]
+        runs = np.arange(first_run, stop_run, dtype=np.int64) * self.year_span
+        offset = min(year - self.first_year, self.year_span - 1)
+        positions = np.searchsorted(self.run_keys, runs + offset, side='right') - 1
+        found = (positions >= 0) & (self.run_keys[np.maximum(positions, 0)] >= runs)
+        return positions[found]
+
+    # Rows at the given positions, with the party categories trimmed to the parties present
+    def rows_frame(self, positions):
+        rows = self.data.iloc[positions]
+        return rows.assign(v2paenname=rows['v2paenname'].cat.remove_unused_categories())
+
+    # Sorted party names of one country
+    def parties(self, country_name):
+        return list(self.party_slices[country_name])
@@ -0,0 +1,67 @@
+# Table-driven score-to-category labels
+#
+# Each variable has ascending bin edges and one label per bin; a score lands in
+# bin i when edges[i - 1] <= score < edges[i]. Scores are binned for a whole
+# column at once and kept as small integer codes, with -1 marking missing scores.
+import numpy as np
+
+# Label shown for scores that are missing (NaN)
+MISSING_LABEL = "No data."
+
+# Edges shared by the 0-4 position scales
+POSITION_EDGES = [1, 2, 3]
+
+# Variable name -> (bin edges, labels)
+LABEL_BINS = {
+    # Economic and social ideology
+    "v2pariglef_osp": ([1, 2, 3, 4, 5, 6], ["Far-Left", "Left", "Center-Left", "Center", "Center-Right", "Right", "Far-Right"]),
+    "ep_v6_lib_cons": ([2, 4, 7, 9], ["Very Liberal", "Liberal", "Moderate", "Conservative", "Very Conservative"]),
+    # Party positions
+    "v2paanteli_osp": (POSITION_EDGES, ["Rhetoric not important.", "Rhetoric somewhat important.", "Rhetoric important.", "Rhetoric very important."]),
+    "v2papeople_osp": (POSITION_EDGES, ["Never centers ordinary people.", "Doesn't usually center ordinary people.", "Usually centers ordinary people.", "Always centers ordinary people."]),
+    "v2paopresp_osp": (POSITION_EDGES, ["Always attacts opponents.", "Usually attacts opponents.", "Doesn't usually attact opponents.", "Never attacts opponents."]),
+    "v2paplur_osp": (POSITION_EDGES, ["Not all all committed.", "Weakly committed.", "Committed.", "Fully committed."]),
+    "v2paminor_osp": (POSITION_EDGES, ["Always against minority rights.", "Usually against minority rights.", "Usually supports minority rights.", "Always supports minority rights."]),
+    "v2paviol_osp": (POSITION_EDGES, ["Encourages violence.", "Sometimes encourages violence.", "Generally discourages violence.", "Always discourages violence."]),
+    "v2paimmig_osp": (POSITION_EDGES, ["Strongly opposes.", "Opposes.", "Supports.", "Strongly supports."]),
+    "v2palgbt_osp": (POSITION_EDGES, ["Strongly opposes.", "Opposes.", "Supports.", "Strongly supports."]),
+    "v2paculsup_osp": (POSITION_EDGES, ["Strongly promotes.", "Promotes.", "Opposes.", "Strongly opposes."]),
+    "v2parelig_osp": (POSITION_EDGES, ["Always invokes.", "Often invokes.", "Rarely invokes.", "Never invokes."]),
+    "v2pagender_osp": (POSITION_EDGES, ["None.", "Small minority.", "Large minority.", "Balanced."]),
+    "v2pawomlab_osp": (POSITION_EDGES, ["Strongly opposes.", "Opposes.", "Supports.", "Strongly supports."]),
+}
+
+
+# Bin a whole column of scores into int8 label codes (-1 for NaN).
+# Scores below the first edge fall in the lowest bin.
+def label_codes(values, column):
+    edges, _ = LABEL_BINS[column]
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.digitize(values, edges).astype(np.int8)
+    codes[np.isnan(values)] = -1
+    return codes
+
+
+# Labels of a variable with MISSING_LABEL appended, so code -1 gathers the missing label
+def label_lookup(column):
+    return np.array(LABEL_BINS[column][1] + [MISSING_LABEL], dtype=object)
+
+
+# Per-variable label codes for every row of the dataset, computed on first use
+class LabelTable:
+    def __init__(self, data):
+        self.data = data
+        self._codes = {}
+        # Built up front (they are tiny): the table is shared by concurrent sessions, and a
+        # lookup published after its codes could be missed by a concurrent strings() call
+        self._lookups = {column: label_lookup(column) for column in LABEL_BINS}
+
+    def codes(self, column):
+        if column not in self._codes:
+            self._codes[column] = label_codes(self.data[column].to_numpy(), column)
+        return self._codes[column]
+
+    # Labels of a row range as strings, with MISSING_LABEL for missing scores
+    def strings(self, column, rows=slice(None)):
+        codes = self.codes(column)[rows]
+        return self._lookups[column][codes]
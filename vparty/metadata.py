@@ -0,0 +1,119 @@
+# Dictionary mapping variable names to user-friendly labels
+label_map = {
+    "v2paanteli_osp": "Anti-Elitism",
+    "v2papeople_osp": "People-Centrism",
+    "v2paopresp_osp": "Political Opponents",
+    "v2paplur_osp": "Political Pluralism",
+    "v2paminor_osp": "Minority Rights",
+    "v2paviol_osp": "Rejection of Political Violence",
+    "v2paimmig_osp": "Immigration",
+    "v2palgbt_osp": "LGBT Social Equality",
+    "v2paculsup_osp": "Cultural Superiority",
+    "v2parelig_osp": "Religious Principles",
+    "v2pagender_osp": "Gender Equality",
+    "v2pawomlab_osp": "Working Women"
+}
+
+# Dictionary mapping variable names to corresponding questions
+question_map = {
+    "v2paanteli_osp": "How important is anti-elite rhetoric for this party?",
+    "v2papeople_osp": "Do leaders of this party glorify the ordinary people and identify themselves as part of them?",
+    "v2paopresp_osp": "Prior to this election, have leaders of this party used severe personal attacks or tactics of demonization against their opponents?",
+    "v2paplur_osp": "Prior to this election, to what extent was the leadership of this political party clearly committed to free and fair elections with multiple parties, freedom of speech, media, assembly and association?",
+    "v2paminor_osp": "According to the leadership of this party, how often should the will of the majority be implemented even if doing so would violate the rights of minorities?",
+    "v2paviol_osp": "To what extent does the leadership of this party explicitly discourage the use of violence against domestic political opponents?",
+    "v2paimmig_osp": "What is the party’s position regarding immigration into the country?",
+    "v2palgbt_osp": "What is this party’s position toward social equality for the lesbian, gay, bisexual, and transgender (LGBT) community?",
+    "v2paculsup_osp": "To what extent does the party leadership promote the cultural superiority of a specific social group or the nation as a whole?",
+    "v2parelig_osp": "To what extent does this party invoke God, religion, or sacred/religious texts to justify its positions?",
+    "v2pagender_osp": "What is the share of women in national-level leadership positions of this political party?",
+    "v2pawomlab_osp": "To what extent does this party support the equal participation of women in the labor market?"
+}
+
+# Dictionary mapping variable names to corresponding coding system
+coding_map = {
+    "v2paanteli_osp": [
+        "0: Not at all important. The leadership of this party never makes statements against the elite.",
+        "1: Not important. The leadership of this party rarely makes statements against the elite.",
+        "2: Somewhat important. The leadership of this party sometimes makes statements against the elite.",
+        "3: Important. The leadership of this party often makes statements against the elite.",
+        "4: Very important. The leadership of this party makes statements against the elite whenever possible."
+    ],
+    "v2papeople_osp": [
+        "0: Never. The party leadership never glorifies and identifies with the ordinary people.",
+        "1: Usually not. The party leadership generally does not glorify and identify with the ordinary people.",
+        "2: About half of the time. The party leadership sometimes glorifies and identifies with the ordinary people.",
+        "3: Usually. The party leadership generally glorifies and identifies with the ordinary people, which they claim to represent.",
+        "4: Always. The party leadership always glorifies and identifies with the ordinary people, which they claim to represent."
+    ],
+    "v2paopresp_osp": [
+        "0: Always. Party leaders always used severe personal attacks or tactics of demonization against their opponents.",
+        "1: Usually. Party leaders usually used severe personal attacks or tactics of demonization against their opponents.",
+        "2: About half of the time. Party leaders sometimes used severe personal attacks or tactics of demonization against their opponents.",
+        "3: Usually not. Party leaders usually did not use severe personal attacks or tactics of demo- nization against their opponents.",
+        "4: Never. Party leaders never used severe personal attacks or tactics of demonization against their opponents."
+    ],
+    "v2paplur_osp": [
+        "0: Not at all committed. The party leadership was not at all committed to free and fair, multi-party elections, freedom of speech, media, assembly and association.",
+        "1: Not committed. The party leadership was not committed to free and fair, multi-party elections, freedom of speech, media, assembly and association.",
+        "2: Weakly committed. The party leadership was weakly committed to free and fair, multi- party elections, freedom of speech, media, assembly and association.",
+        "3: Committed. The party leadership was committed to free and fair, multi-party elections, freedom of speech, media, assembly and association.",
+        "4: Fully committed. The party leadership was fully committed to free and fair, multi-party elections, freedom of speech, media, assembly and association."
+    ],
+    "v2paminor_osp": [
+        "0: Always. The leadership of this party argues that the will of the majority should always determine policy even if such policy violates minority rights.",
+        "1: Usually. The leadership of this party argues that the will of the majority should usually determine policy even if such policy violates minority rights.",
+        "2: Half of the time. The leadership of this party argues that the will of the majority should about half of the time determine policy even if such policy violate minority rights.",
+        "3: Usually not. The leadership of this party argues that the will of the majority should usually not determine policy if such policy violates minority rights.",
+        "4: Never. The leadership of this party argues that the will of the majority should never determine policy if such policy violates minority rights."
+    ],
+    "v2paviol_osp": [
+        "0: Encourages. Leaders of this party often encourage the use of violence against domestic political opponents.",
+        "1: Sometimes encourages. Leaders of this party sometimes encourage the use of violence against domestic political opponents and generally refrain from discouraging it.",
+        "2: Discourages about half of the time. Leaders of this party occasionally discourage the use of violence against domestic political opponents, and do not encourage it.",
+        "3: Generally discourages. Leaders of this party often discourage the use of violence against its domestic political opponents.",
+        "4: Consistently discourages. Leaders of this party consistently reject the use of violence against its domestic political opponents."
+    ],
+    "v2paimmig_osp": [
+        "0: Strongly opposes. This party strongly opposes all or almost all forms of immigration into the country.",
+        "1: Opposes. This party opposes most forms of immigration into the country.",
+        "2: Ambiguous/No position. This party has no clear policy with regard to immigration into the country.",
+        "3: Supports. This party supports most forms of immigration into the country.",
+        "4: Strongly supports. This party strongly supports all or almost all forms of immigration into the country."
+    ],
+    "v2palgbt_osp": [
+        "0: Strongly opposes. This party is strongly opposed to LGBT social equality.",
+        "1: Opposes. This party is opposed to LGBT social equality.",
+        "2: Ambiguous/No position. This party has no clear policy with regard to LGBT social equality.",
+        "3: Supports. This party supports LGBT social equality.",
+        "4: Strongly supports. This party strongly supports LGBT social equality."
+    ],
+    "v2paculsup_osp": [
+        "0: Strongly promotes. The party strongly promotes the cultural superiority of a specific social group or the nation as a whole.",
+        "1: Promotes. The party promotes the cultural superiority of a specific social group or the nation as a whole.",
+        "2: Ambiguous. The party does not take a specific position on the cultural superiority of a specific social group or the nation as a whole.",
+        "3: Opposes. The party opposes the promotion of the cultural superiority of a specific social group or the nation as a whole.",
+        "4: Strongly opposes. The party strongly opposes the promotion of the cultural superiority of a specific social group or the nation as a whole."
+    ],
+    "v2parelig_osp": [
+        "0: Always, or almost always. The party almost always invokes God, religion, or sacred/religious texts to justify its positions.",
+        "1: Often, but not always. The party often, but not always, invokes God, religion, or religious texts to justify its positions.",
+        "2: About half of the time. The party about half of the time invokes God, religion, or religious texts to justify its positions.",
+        "3: Rarely. The party rarely invokes God, religion, or religious texts to justify its positions.",
+        "4: Never. The party never invokes God, religion, or religious texts to justify its positions."
+    ],
+    "v2pagender_osp": [
+        "0: None.",
+        "1: Small minority (about 1-15%).",
+        "2: Medium minority (about 16-25%).",
+        "3: Large minority (about 26-39%).",
+        "4: Balanced (about 40% or more)."
+    ],
+    "v2pawomlab_osp": [
+        "0: Strongly opposes. This party strongly opposes all or almost all types of measures that support the equal participation of women in the labor market.",
+        "1: Opposes. This party opposes most types of measures that support the equal participation of women in the labor market.",
+        "2: Ambiguous/No position. This party has no clear policy with regard to measures that support the equal participation of women in the labor market.",
+        "3: Supports. This party supports most types of measures that support the equal participation of women in the labor market.",
+        "4: Strongly supports. This party strongly supports all or almost all types of measures that support the equal participation of women in the labor market."
+    ],
+}
@@ -0,0 +1,149 @@
+# Chunked ingest of the source CSV into one Arrow file per country
+#
+# Layout of the partition directory:
+#   partitions.json - source fingerprint, columns, dtypes and country -> file/row count map
+#   <NNN>.arrow     - uncompressed Arrow IPC file with the rows of one country
+# The CSV is streamed in chunks of `chunk_rows` rows; each chunk is split by
+# country and appended as a record batch to that country's file, so peak memory
+# depends on the chunk size rather than on the size of the source. The index is
+# written last, so a directory with an index is complete.
+#
+# The columns and their dtypes are a parameter (V-Party's by default), so wider
+# files such as the V-Dem country-year data can be ingested alongside V-Party:
+# any projection that includes the partition key, country_name, works.
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from vparty.data import COLUMN_DTYPES, CSV_FILE_PATH, USED_COLUMNS
+from vparty.index import group_runs, sort_dataset
+from vparty.store import file_hash, source_stat, write_atomic
+
+PARTITION_DIR = os.environ.get('VPARTY_PARTITION_DIR', 'partitions')
+INDEX_FILE = 'partitions.json'
+CHUNK_ROWS = 100_000
+
+# Bump whenever the partition schema changes
+PARTITION_VERSION = 2
+
+# Rows are partitioned on this column
+PARTITION_KEY = 'country_name'
+
+
+# Names of the category columns of a projection. They are stored as plain strings (a
+# dictionary would have to be identical in every batch of a file) and become
+# categoricals again when a partition is loaded.
+def name_columns(dtypes):
+    return [column for column, dtype in dtypes.items() if dtype == 'category']
+
+
+# Arrow schema of the partitions of a projection
+def partition_schema(columns, dtypes):
+    return pa.schema([(column, pa.string()) if dtypes[column] == 'category' else (column, pa.from_numpy_dtype(np.dtype(dtypes[column])))
+                      for column in columns])
+
+
+# One record batch holding `rows` of a chunk; NaN scores stay NaN
+def _record_batch(chunk, rows, schema, dtypes):
+    arrays = []
+    for column in schema.names:
+        values = chunk[column].to_numpy()[rows]
+        if dtypes[column] == 'category':
+            arrays.append(pa.array(values, type=pa.string(), from_pandas=True))
+        else:
+            arrays.append(pa.array(values.astype(dtypes[column]), from_pandas=False))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# Stream the CSV into per-country partitions and write the index. `columns` is the
+# projection to keep and `dtypes` maps each of them to a numpy dtype or 'category'.
+def ingest(csv_file_path=CSV_FILE_PATH, partition_dir=PARTITION_DIR, chunk_rows=CHUNK_ROWS, columns=USED_COLUMNS, dtypes=COLUMN_DTYPES):
+    started = time.time()
+    columns = list(columns)
+    if PARTITION_KEY not in columns:
+        raise ValueError(f"The ingested columns must include {PARTITION_KEY!r}")
+    missing = [column for column in columns if column not in dtypes]
+    if missing:
+        raise ValueError(f"No dtype for columns {missing}")
+    dtypes = {column: dtypes[column] for column in columns}
+    schema = partition_schema(columns, dtypes)
+    chunk_dtypes = {column: dtype for column, dtype in dtypes.items() if dtype != 'category'}
+    stat = source_stat(csv_file_path)
+    os.makedirs(partition_dir, exist_ok=True)
+
+    writers = {}
+    row_counts = {}
+    try:
+        chunks = pd.read_csv(csv_file_path, usecols=columns, dtype=chunk_dtypes, chunksize=chunk_rows)
+        for chunk in chunks:
+            countries = chunk[PARTITION_KEY].to_numpy(dtype=object)
+            present = pd.notna(countries)
+            codes, names = pd.factorize(countries[present])
+            order = np.flatnonzero(present)[np.argsort(codes, kind='stable')]
+            sorted_codes = np.sort(codes, kind='stable')
+            for start, stop in zip(*group_runs(sorted_codes)):
+                country = names[sorted_codes[start]]
+                if country not in writers:
+                    path = os.path.join(partition_dir, f"{len(writers):03d}.arrow.tmp")
+                    writers[country] = pa.ipc.new_file(path, schema)
+                    row_counts[country] = 0
+                writers[country].write_batch(_record_batch(chunk, order[start:stop], schema, dtypes))
+                row_counts[country] += int(stop - start)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    files = {}
+    for i, country in enumerate(writers):
+        files[country] = f"{i:03d}.arrow"
+        os.replace(os.path.join(partition_dir, f"{files[country]}.tmp"), os.path.join(partition_dir, files[country]))
+
+    index = {
+        'version': PARTITION_VERSION,
+        'source': os.path.abspath(csv_file_path),
+        'sha256': file_hash(csv_file_path),
+        **stat,
+        'columns': columns,
+        'dtypes': dtypes,
+        'chunk_rows': chunk_rows,
+        'rows': sum(row_counts.values()),
+        'countries': {country: {'file': files[country], 'rows': row_counts[country]} for country in sorted(files)},
+        'seconds': time.time() - started,
+    }
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(index, f, indent=2)
+    write_atomic(os.path.join(partition_dir, INDEX_FILE), write)
+    return index
+
+
+# Read one partition file, with the columns in `names` as categoricals. Partitions
+# holding parties and years are sorted by (country, party, year); others keep the file order.
+def read_partition(path, names):
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    data = table.to_pandas()
+    for column in names:
+        data[column] = data[column].astype('category')
+    return sort_dataset(data) if {'v2paenname', 'year'} <= set(data.columns) else data
+
+
+class PartitionStore:
+    def __init__(self, partition_dir=PARTITION_DIR):
+        self.partition_dir = partition_dir
+        with open(os.path.join(partition_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        if self.index.get('version') != PARTITION_VERSION:
+            raise ValueError(f"{partition_dir} was written by another version; run `python -m vparty ingest` again")
+        self.countries = list(self.index['countries'])
+        self.columns = self.index['columns']
+        self.fingerprint = self.index['sha256']
+        self._names = name_columns(self.index['dtypes'])
+
+    # Rows of one country, read from its partition only
+    def load(self, country_name):
+        return read_partition(os.path.join(self.partition_dir, self.index['countries'][country_name]['file']), self._names)
@@ -0,0 +1,182 @@
+# Compaction of figure JSON before it is sent to the browser
+#
+# Works on the plotly JSON of a built figure, trace by trace:
+#   - points that cannot be drawn (a missing coordinate) are dropped; in line
+#     traces a run of missing points is kept as a single gap marker
+#   - coordinates are rounded to DECIMALS places, plenty for the 0-4 and 0-10
+#     scales (hover labels show two decimals)
+#   - a marker trace whose customdata repeats a few long strings per point
+#     (party, country) is split into one trace per distinct value: the value is
+#     stored once as the trace's meta and a per-point colour array that is
+#     constant within each value becomes a single colour
+# The layout and the rendered chart stay the same; only the bytes shrink.
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+# Compaction is on by default; VPARTY_COMPACT_PAYLOADS=0 ships plotly's JSON as is
+COMPACT_PAYLOADS = os.environ.get('VPARTY_COMPACT_PAYLOADS', '1') not in ('', '0')
+
+DECIMALS = 2
+
+# Trace attributes holding one value per point
+POINT_ARRAYS = ['x', 'y', 'z', 'customdata', 'text', 'hovertext', 'ids']
+MARKER_ARRAYS = ['color', 'size', 'symbol', 'opacity']
+
+_CUSTOMDATA_REF = re.compile(r'%\{customdata\[(\d+)\]')
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _point_count(trace):
+    for name in ('x', 'y', 'z'):
+        if isinstance(trace.get(name), list):
+            return len(trace[name])
+    return 0
+
+
+# The trace restricted to the points at `keep` (a list of indices)
+def _take(trace, keep):
+    n = _point_count(trace)
+    trace = dict(trace)
+    for name in POINT_ARRAYS:
+        if isinstance(trace.get(name), list) and len(trace[name]) == n:
+            trace[name] = [trace[name][i] for i in keep]
+    if isinstance(trace.get('marker'), dict):
+        marker = trace['marker'] = dict(trace['marker'])
+        for name in MARKER_ARRAYS:
+            if isinstance(marker.get(name), list) and len(marker[name]) == n:
+                marker[name] = [marker[name][i] for i in keep]
+    return trace
+
+
+# Drop points with a missing coordinate; line traces keep one gap between present points
+def strip_missing(trace):
+    axes = [trace[name] for name in ('x', 'y', 'z') if isinstance(trace.get(name), list)]
+    if not axes:
+        return trace
+    missing = [any(_is_missing(axis[i]) for axis in axes) for i in range(len(axes[0]))]
+    if not any(missing):
+        return trace
+    if 'lines' in trace.get('mode', 'lines'):
+        keep = []
+        for i, gap in enumerate(missing):
+            if not gap:
+                keep.append(i)
+            elif keep and not missing[keep[-1]]:
+                keep.append(i)
+        while keep and missing[keep[-1]]:
+            keep.pop()
+    else:
+        keep = [i for i, gap in enumerate(missing) if not gap]
+    return _take(trace, keep)
+
+
+def _rounded(values, decimals):
+    array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    rounded = np.round(array, decimals).tolist()
+    if np.isnan(array).any():
+        rounded = [None if value != value else value for value in rounded]
+    return rounded
+
+
+# Round numeric coordinates (and marker sizes) to `decimals` places
+def round_coordinates(trace, decimals=DECIMALS):
+    trace = dict(trace)
+    for name in ('x', 'y', 'z'):
+        values = trace.get(name)
+        if isinstance(values, list) and values and all(value is None or isinstance(value, (int, float)) for value in values):
+            if not all(isinstance(value, int) for value in values):
+                trace[name] = _rounded(values, decimals)
+    marker = trace.get('marker')
+    if isinstance(marker, dict) and isinstance(marker.get('size'), list):
+        trace['marker'] = dict(marker, size=_rounded(marker['size'], 1))
+    return trace
+
+
+# Colour a stepped colorscale gives `value`, or None if it is not inside one constant step
+def _step_color(value, marker):
+    scale, low, high = marker.get('colorscale'), marker.get('cmin'), marker.get('cmax')
+    if not isinstance(scale, list) or low is None or high is None or high == low:
+        return None
+    position = (value - low) / (high - low)
+    for (start, start_color), (stop, stop_color) in zip(scale, scale[1:]):
+        if start <= position <= stop:
+            return start_color if start_color == stop_color else None
+    return None
+
+
+# A single colour for a group of points if their colours all resolve to the same one
+def _group_color(colors, marker):
+    resolved = {color if isinstance(color, str) else _step_color(color, marker) for color in colors}
+    if len(resolved) == 1 and None not in resolved:
+        return resolved.pop()
+    return None
+
+
+# Split a marker trace on the customdata string column that saves the most bytes
+def split_categories(trace):
+    customdata = trace.get('customdata')
+    template = trace.get('hovertemplate', '')
+    if 'markers' not in trace.get('mode', '') or not isinstance(customdata, list) or not customdata or not isinstance(customdata[0], list):
+        return [trace]
+
+    overhead = len(json.dumps({name: value for name, value in trace.items() if name not in POINT_ARRAYS and name != 'marker'})) + 100
+    best, best_saving = None, 0
+    for column in {int(match) for match in _CUSTOMDATA_REF.findall(template)}:
+        values = [row[column] for row in customdata]
+        if not all(isinstance(value, str) for value in values):
+            continue
+        saving = sum(len(value) + 3 for value in values) - len(set(values)) * overhead
+        if saving > best_saving:
+            best, best_saving = column, saving
+    if best is None:
+        return [trace]
+
+    def reindex(match):
+        column = int(match.group(1))
+        if column == best:
+            return '%{meta[0]'
+        return f"%{{customdata[{column - 1 if column > best else column}]"
+
+    groups = {}
+    for i, row in enumerate(customdata):
+        groups.setdefault(row[best], []).append(i)
+    marker = trace.get('marker', {})
+    traces = []
+    for value, keep in groups.items():
+        part = _take(trace, keep)
+        part['customdata'] = [row[:best] + row[best + 1:] for row in part['customdata']]
+        part['hovertemplate'] = _CUSTOMDATA_REF.sub(reindex, template)
+        part['meta'] = [value]
+        # A single trace has no legend; the parts keep it that way (or share one entry)
+        part['showlegend'] = bool(trace.get('showlegend')) and not traces
+        if trace.get('showlegend'):
+            part['legendgroup'] = trace.get('legendgroup') or trace.get('name', '')
+        colors = part.get('marker', {}).get('color')
+        if isinstance(colors, list):
+            color = _group_color(colors, marker)
+            if color is not None:
+                part['marker'] = {name: setting for name, setting in part['marker'].items() if name not in ('colorscale', 'cmin', 'cmax')}
+                part['marker']['color'] = color
+        traces.append(part)
+    return traces
+
+
+# Compacted copy of a figure dict
+def compact_figure(figure):
+    traces = []
+    for trace in figure.get('data', []):
+        traces += split_categories(round_coordinates(strip_missing(trace)))
+    return dict(figure, data=traces)
+
+
+# Compacted figure JSON and its size before and after
+def compact_json(figure_json):
+    compacted = json.dumps(compact_figure(json.loads(figure_json)), separators=(',', ':'))
+    return compacted, {'before': len(figure_json), 'after': len(compacted)}
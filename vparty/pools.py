@@ -0,0 +1,30 @@
+# Process pools of the batch jobs (prebuild, cluster, trajectories)
+#
+# A job's per-process state - the memory-mapped store and what it derives from
+# it - is loaded once per worker by the pool initializer and kept here under the
+# job's name, so tasks only carry their own arguments. The parent process loads
+# the same state to plan the tasks, and to run them itself when no pool is needed.
+from concurrent.futures import ProcessPoolExecutor
+
+_state = {}
+
+
+def _load(name, load, args):
+    _state[name] = load(*args)
+
+
+# Load job `name`'s state in this process with `load(*args)` and return it
+def load_state(name, load, *args):
+    _load(name, load, args)
+    return _state[name]
+
+
+# State of job `name` in this process: a worker's, or the parent's after load_state
+def state(name):
+    return _state[name]
+
+
+# Pool whose workers each load job `name`'s state with `load(*args)`; `load` must be
+# a module-level function so that it can be sent to the workers
+def worker_pool(name, load, *args, workers=None):
+    return ProcessPoolExecutor(max_workers=workers, initializer=_load, initargs=(name, load, args))
@@ -0,0 +1,106 @@
+# Offline prebuild of every country x position chart into a static directory
+#
+# Layout of the output directory:
+#   manifest.json            - dataset fingerprint, variables and country -> directory map
+#   <NNN>/<variable>.json.gz - {"line": figure, "scatter": figure, "legend": [[party, colour], ...]}
+# The manifest is written last, so a directory with a manifest is complete.
+import gzip
+import json
+import os
+import time
+
+from vparty import pools, store
+from vparty.data import CSV_FILE_PATH
+from vparty.figures import HOVER_MODE, country_party_colors, legend_entries, line_figure, scatter_figure
+from vparty.index import DatasetIndex
+from vparty.labels import LabelTable
+from vparty.metadata import label_map
+from vparty.payload import COMPACT_PAYLOADS, compact_json
+
+PREBUILT_DIR = 'prebuilt'
+MANIFEST_FILE = 'manifest.json'
+
+
+def blob_path(prebuilt_dir, country_dir, identity_score):
+    return os.path.join(prebuilt_dir, country_dir, f"{identity_score}.json.gz")
+
+
+# Serialize the charts and legend of one (country, variable) pair as a JSON document
+def build_blob(index, labels, party_colors, country_name, identity_score):
+    rows = index.country_frame(country_name)
+    line_json = line_figure(rows, identity_score, party_colors).to_json()
+    scatter_json = scatter_figure(rows, identity_score, party_colors, labels, index.country_slices[country_name]).to_json()
+    if COMPACT_PAYLOADS:
+        line_json, _ = compact_json(line_json)
+        scatter_json, _ = compact_json(scatter_json)
+    legend_json = json.dumps(legend_entries(rows, identity_score, party_colors))
+    return f'{{"line": {line_json}, "scatter": {scatter_json}, "legend": {legend_json}}}'
+
+
+# Per-worker dataset state; each worker memory-maps the same Arrow store, so the columns are shared
+def _load_worker(store_dir):
+    index = DatasetIndex(store.read_store(store_dir))
+    return {'index': index, 'labels': LabelTable(index.data), 'party_colors': country_party_colors(index)}
+
+
+def _build_country(prebuilt_dir, country_name, country_dir):
+    worker = pools.state('prebuild')
+    os.makedirs(os.path.join(prebuilt_dir, country_dir), exist_ok=True)
+    total_bytes = 0
+    for identity_score in label_map:
+        document = build_blob(worker['index'], worker['labels'], worker['party_colors'][country_name], country_name, identity_score)
+        blob = gzip.compress(document.encode())
+        path = blob_path(prebuilt_dir, country_dir, identity_score)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(blob)
+        os.replace(f"{path}.tmp", path)
+        total_bytes += len(blob)
+    return country_name, total_bytes
+
+
+# Build every blob with a process pool and write the manifest
+def prebuild(prebuilt_dir=PREBUILT_DIR, csv_file_path=CSV_FILE_PATH, store_dir=store.STORE_DIR, workers=None, countries=None):
+    started = time.time()
+    meta = store.ensure_store(csv_file_path, store_dir)
+    worker = pools.load_state('prebuild', _load_worker, store_dir)
+    if countries is None:
+        countries = worker['index'].countries
+    country_dirs = {country: f"{i:03d}" for i, country in enumerate(countries)}
+
+    os.makedirs(prebuilt_dir, exist_ok=True)
+    total_bytes = 0
+    with pools.worker_pool('prebuild', _load_worker, store_dir, workers=workers) as pool:
+        futures = [pool.submit(_build_country, prebuilt_dir, country, country_dir) for country, country_dir in country_dirs.items()]
+        for future in futures:
+            _, country_bytes = future.result()
+            total_bytes += country_bytes
+
+    manifest = {
+        'fingerprint': meta['sha256'],
+        'hover_mode': HOVER_MODE,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'variables': list(label_map),
+        'countries': country_dirs,
+        'bytes': total_bytes,
+    }
+    with open(os.path.join(prebuilt_dir, f"{MANIFEST_FILE}.tmp"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(prebuilt_dir, f"{MANIFEST_FILE}.tmp"), os.path.join(prebuilt_dir, MANIFEST_FILE))
+    manifest['seconds'] = time.time() - started
+    return manifest
+
+
+# Read-only access to a prebuilt directory
+class PrebuiltStore:
+    def __init__(self, prebuilt_dir=PREBUILT_DIR):
+        self.prebuilt_dir = prebuilt_dir
+        with open(os.path.join(prebuilt_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.fingerprint = self.manifest['fingerprint']
+        self.countries = list(self.manifest['countries'])
+
+    # Decoded blob of one (country, variable) pair: figures as dicts plus legend entries
+    def read(self, country_name, identity_score):
+        path = blob_path(self.prebuilt_dir, self.manifest['countries'][country_name], identity_score)
+        with gzip.open(path, 'rb') as f:
+            return json.loads(f.read())
@@ -0,0 +1,92 @@
+# Lightweight per-rerun stage timing
+#
+# A RerunProfiler is activated for the thread running one script rerun. Code
+# anywhere on the hot path wraps its work in `with stage('name'):`; when no
+# profiler is active that costs one thread-local lookup.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Profiling is enabled for every rerun with VPARTY_PROFILE=1, or per session with ?profile=1
+PROFILE_ENABLED = os.environ.get('VPARTY_PROFILE', '') not in ('', '0')
+PROFILE_LOG = os.environ.get('VPARTY_PROFILE_LOG', 'vparty_profile.jsonl')
+
+_active = threading.local()
+_log_lock = threading.Lock()
+
+
+class RerunProfiler:
+    def __init__(self, **context):
+        self.context = context
+        self.stages = {}
+        self.payload_bytes = {}
+        self.started = time.perf_counter()
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record(self):
+        return {
+            'time': time.time(),
+            **self.context,
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'stages_ms': {name: seconds * 1000 for name, seconds in self.stages.items()},
+            'payload_bytes': self.payload_bytes,
+        }
+
+
+# Make `profiler` the active profiler of the current thread (None deactivates)
+def activate(profiler):
+    _active.profiler = profiler
+
+
+def active():
+    return getattr(_active, 'profiler', None)
+
+
+# Time a block of work as stage `name` of the active profiler, if any
+@contextmanager
+def stage(name):
+    profiler = active()
+    if profiler is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - started)
+
+
+# Append one rerun record to the JSONL log
+def write_record(record, path=PROFILE_LOG):
+    line = json.dumps(record) + '\n'
+    with _log_lock:
+        with open(path, 'a') as f:
+            f.write(line)
+
+
+def read_records(path=PROFILE_LOG):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# p50/p95/max latency per stage (and for the whole rerun) over a list of records
+def summarize(records):
+    samples = {'total': [record['total_ms'] for record in records]}
+    for record in records:
+        for name, ms in record['stages_ms'].items():
+            samples.setdefault(name, []).append(ms)
+    return {
+        name: {
+            'count': len(values),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'max_ms': float(np.max(values)),
+        }
+        for name, values in samples.items()
+    }
@@ -0,0 +1,92 @@
+# Nearest party-years across the whole dataset
+#
+# Every party-year is a point in the space of the two ideology scales and the
+# twelve position variables. Each column is standardized (z-score) so the 0-4,
+# 0-6 and 0-10 scales weigh the same, and the matrix is kept as float32 with
+# missing scores zero-filled next to a presence mask.
+#
+# Distance is NaN-aware Euclidean: squared differences are summed over the
+# variables both party-years have, then scaled up by (variables / shared) so
+# pairs sharing fewer variables are not closer just for that. Pairs sharing
+# fewer than MIN_SHARED variables are not compared at all.
+import numpy as np
+import pandas as pd
+
+from vparty.data import SCORE_COLUMNS
+
+FEATURE_COLUMNS = SCORE_COLUMNS
+
+# Minimum number of variables two party-years must both have to be compared
+MIN_SHARED = 4
+
+
+# Standardized float32 score matrix with missing scores at 0 (the column mean),
+# the presence mask, and the column means and standard deviations
+def score_matrix(data):
+    values = np.column_stack([data[column].to_numpy(dtype=np.float64) for column in FEATURE_COLUMNS])
+    present = ~np.isnan(values)
+    mean = np.nanmean(values, axis=0)
+    std = np.nanstd(values, axis=0)
+    std[~(std > 0)] = 1.0
+    return np.where(present, (values - mean) / std, 0.0).astype(np.float32), present, mean, std
+
+
+class SimilarityIndex:
+    # `data` is the (country, party, year) sorted frame of a DatasetIndex
+    def __init__(self, data):
+        self.features, present, self.mean, self.std = score_matrix(data)
+        self.squares = self.features ** 2
+        self.present = present.astype(np.float32)
+
+        self.country_codes = data['country_name'].cat.codes.to_numpy()
+        self.party_codes = data['v2paenname'].cat.codes.to_numpy()
+        self.country_names = data['country_name'].cat.categories
+        self.party_names = data['v2paenname'].cat.categories
+        self.years = data['year'].to_numpy()
+
+    # Squared NaN-aware distances from row `row` to every row, and the shared variable counts.
+    # Expanded as sum(m*x^2) - 2 sum(m*x*q) + sum(m*q^2) over the query's present
+    # variables m, so it is three matrix-vector products with no temporary (n, d) array.
+    def _distances(self, row):
+        query = self.features[row]
+        mask = self.present[row]
+        shared = self.present @ mask
+        squared = self.squares @ mask - 2 * (self.features @ (query * mask)) + self.present @ (query * query * mask)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scaled = np.maximum(squared, 0) * (len(FEATURE_COLUMNS) / shared)
+        scaled[(shared < MIN_SHARED) | (self.country_codes < 0)] = np.inf
+        return scaled, shared
+
+    # The k nearest party-years to row `row`. Other years of the same party are always
+    # skipped; `other_countries` also skips the row's own country, and `distinct_parties`
+    # keeps only the closest year of each party.
+    def query(self, row, k=10, other_countries=True, distinct_parties=True):
+        distances, shared = self._distances(row)
+        if other_countries:
+            distances[self.country_codes == self.country_codes[row]] = np.inf
+        else:
+            distances[(self.country_codes == self.country_codes[row]) & (self.party_codes == self.party_codes[row])] = np.inf
+
+        # Rank a pool of candidates, widening it until k distinct parties are found
+        finite = int(np.isfinite(distances).sum())
+        pool = min(finite, 20 * k)
+        while True:
+            candidates = np.argpartition(distances, pool - 1)[:pool] if 0 < pool < len(distances) else np.arange(len(distances))
+            candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+            candidates = candidates[np.isfinite(distances[candidates])]
+            if distinct_parties:
+                pairs = self.country_codes[candidates].astype(np.int64) * (len(self.party_names) + 1) + self.party_codes[candidates]
+                _, first = np.unique(pairs, return_index=True)
+                candidates = candidates[np.sort(first)]
+            if len(candidates) >= k or pool >= finite:
+                break
+            pool = min(finite, pool * 4)
+        nearest = candidates[:k]
+
+        return pd.DataFrame({
+            'Country': self.country_names.to_numpy(dtype=object)[self.country_codes[nearest]],
+            'Party': self.party_names.to_numpy(dtype=object)[self.party_codes[nearest]],
+            'Year': self.years[nearest],
+            'Distance': np.sqrt(distances[nearest]),
+            'Shared variables': shared[nearest].astype(int),
+        })
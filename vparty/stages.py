@@ -0,0 +1,188 @@
+# The dashboard's data flow as pure, individually memoized stages
+#
+#   dataset -> country slice -> per-variable series -> figures
+#
+# Every stage is a function of explicit inputs and is cached on exactly those
+# keys, so an interaction only recomputes the stages whose inputs changed:
+# switching the position variable reuses the country slice and its party
+# colours. Stages are evaluated lazily, so a figure served from the figure
+# cache never touches its upstream stages.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from vparty.compare import comparison_legend_entries, comparison_line_figure, comparison_scatter_figure
+from vparty.figures import add_trend_overlay, family_scatter_figure, legend_entries, legend_html, line_figure, scatter_figure
+from vparty.payload import COMPACT_PAYLOADS, compact_json
+
+# Entries kept per object stage (figures are bounded by the figure cache's byte budget)
+STAGE_ENTRIES = {'country': 32, 'series': 128, 'compare_rows': 4}
+
+
+# Rows of one country (or of a year selection of it), their positions in the
+# dataset (a slice or an array), and the country's party colours
+class CountrySlice:
+    def __init__(self, rows, positions, party_colors):
+        self.rows = rows
+        self.positions = positions
+        self.party_colors = party_colors
+
+
+class Series:
+    def __init__(self, rows, legend):
+        self.rows = rows
+        self.legend = legend
+
+
+class Pipeline:
+    def __init__(self, index, labels, party_colors, fingerprint, figure_cache):
+        self.index = index
+        self.labels = labels
+        self.party_colors = party_colors
+        self.fingerprint = fingerprint
+        self.figure_cache = figure_cache
+        self._entries = {name: OrderedDict() for name in STAGE_ENTRIES}
+        self._stats = {}
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name, hit):
+        with self._lock:
+            counts = self._stats.setdefault(name, {'hits': 0, 'misses': 0})
+            counts['hits' if hit else 'misses'] += 1
+
+    # Value of object stage `name` for `key`, calling `build()` on a miss
+    def _memo(self, name, key, build):
+        entries = self._entries[name]
+        with self._lock:
+            if key in entries:
+                entries.move_to_end(key)
+                value = entries[key]
+            else:
+                value = None
+        if value is not None:
+            self._count(name, True)
+            return value
+        self._count(name, False)
+        value = build()
+        with self._lock:
+            entries[key] = value
+            while len(entries) > STAGE_ENTRIES[name]:
+                entries.popitem(last=False)
+        return value
+
+    # Text of figure stage `name` for `key` from the shared figure cache; a miss is a call of `build()`
+    def _figure_text(self, name, key, build):
+        built = []
+
+        def tracked_build():
+            built.append(True)
+            return build()
+
+        text = self.figure_cache.get_text(self.fingerprint, key + (name,), tracked_build)
+        self._count(name, not built)
+        return text
+
+    # JSON of figure stage `name`, compacted before it is cached (and so before every render)
+    def _figure_json(self, name, key, build):
+        def build_json():
+            text = build().to_json()
+            if not COMPACT_PAYLOADS:
+                return text
+            text, sizes = compact_json(text)
+            with self._lock:
+                self._payloads[name] = sizes
+            return text
+        return self._figure_text(name, key, build_json)
+
+    # Rows of one country: all of them, those with a year in `years` = (start, end), or
+    # with `snapshot` = year each party's latest row at or before that year
+    def country(self, country_name, years=None, snapshot=None):
+        def build():
+            if snapshot is not None:
+                positions = self.index.snapshot_rows(country_name, snapshot)
+            elif years is not None:
+                positions = self.index.year_range_rows(country_name, *years)
+            else:
+                return CountrySlice(self.index.country_frame(country_name), self.index.country_slices[country_name], self.party_colors[country_name])
+            return CountrySlice(self.index.rows_frame(positions), positions, self.party_colors[country_name])
+        return self._memo('country', (country_name, years, snapshot), build)
+
+    # The columns the line chart needs for one variable, and the legend of the
+    # parties with at least one score for it
+    def series(self, country_name, identity_score, years=None):
+        def build():
+            country = self.country(country_name, years)
+            rows = country.rows[['year', 'v2paenname', identity_score]]
+            return Series(rows, legend_entries(rows, identity_score, country.party_colors))
+        return self._memo('series', (country_name, identity_score, years), build)
+
+    def line_json(self, country_name, identity_score, years=None):
+        def build():
+            series = self.series(country_name, identity_score, years)
+            return line_figure(series.rows, identity_score, self.country(country_name, years).party_colors, years)
+        return self._figure_json('line', (country_name, identity_score, years), build)
+
+    # Line chart with the precomputed trend and shift overlay of `trajectories`
+    def trend_line_json(self, country_name, identity_score, trajectories, years=None):
+        def build():
+            country = self.country(country_name, years)
+            series = self.series(country_name, identity_score, years)
+            fig = line_figure(series.rows, identity_score, country.party_colors, years)
+            return add_trend_overlay(fig, series.rows, identity_score, country.party_colors,
+                                     trajectories.trend(identity_score, country.positions),
+                                     trajectories.shifts(identity_score, country.positions))
+        return self._figure_json('trend-line', (country_name, identity_score, years, trajectories.key), build)
+
+    # 3D scatter of the country's rows in `years`, or of its snapshot at year `snapshot`
+    def scatter_json(self, country_name, identity_score, years=None, snapshot=None):
+        if snapshot is not None:
+            years = None
+
+        def build():
+            country = self.country(country_name, years, snapshot)
+            return scatter_figure(country.rows, identity_score, country.party_colors, self.labels, country.positions)
+        return self._figure_json('scatter', (country_name, identity_score, years, snapshot), build)
+
+    # 3D scatter coloured by the families of a persisted clustering with k families
+    def family_scatter_json(self, country_name, identity_score, clustering, k, years=None, snapshot=None):
+        if snapshot is not None:
+            years = None
+
+        def build():
+            country = self.country(country_name, years, snapshot)
+            families = clustering.labels(k)[country.positions].astype(np.intp)
+            return family_scatter_figure(country.rows, identity_score, families, clustering.family_names(k), self.labels, country.positions)
+        return self._figure_json('family-scatter', (country_name, identity_score, years, snapshot, clustering.key, k), build)
+
+    def legend(self, country_name, identity_score, years=None):
+        return self._figure_text('legend', (country_name, identity_score, years),
+                                 lambda: legend_html(self.series(country_name, identity_score, years).legend))
+
+    # Rows of several countries; `compare_key` is 'all' or the sorted tuple of names
+    def compare_rows(self, compare_key):
+        countries = self.index.countries if compare_key == 'all' else list(compare_key)
+        return self._memo('compare_rows', (compare_key,), lambda: self.index.countries_frame(countries))
+
+    def compare_line_json(self, compare_key, identity_score):
+        return self._figure_json('compare-line', (compare_key, identity_score),
+                                 lambda: comparison_line_figure(self.compare_rows(compare_key), identity_score))
+
+    def compare_scatter_json(self, compare_key, identity_score):
+        return self._figure_json('compare-scatter', (compare_key, identity_score),
+                                 lambda: comparison_scatter_figure(self.compare_rows(compare_key), identity_score))
+
+    def compare_legend(self, compare_key):
+        countries = self.index.countries if compare_key == 'all' else compare_key
+        return self._figure_text('compare-legend', (compare_key,), lambda: legend_html(comparison_legend_entries(countries)))
+
+    # Hit/miss counts per stage
+    def stats(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    # JSON bytes before and after compaction of the last build of each figure stage
+    def payload_stats(self):
+        with self._lock:
+            return {name: dict(sizes) for name, sizes in self._payloads.items()}
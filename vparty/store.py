@@ -0,0 +1,148 @@
+# On-disk columnar copy of the projected V-Party dataset
+#
+# The CSV is parsed once into an uncompressed Arrow IPC (Feather v2) file that
+# later processes memory-map instead of re-parsing. Float and integer columns
+# are written without validity bitmaps (NaN stays NaN), so reading them back
+# is zero-copy and every worker on a node shares the same page cache.
+import hashlib
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from vparty.data import CSV_FILE_PATH, read_dataset
+from vparty.index import sort_dataset
+
+STORE_DIR = os.environ.get('VPARTY_CACHE_DIR', '.vparty_cache')
+STORE_FILE = 'dataset.arrow'
+META_FILE = 'dataset.json'
+
+# Bump whenever the stored columns or dtypes change so old stores get rebuilt
+STORE_VERSION = 2
+
+
+# Size and modification time of the source file, the cheap part of the fingerprint
+def source_stat(csv_file_path):
+    stat = os.stat(csv_file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# SHA-256 of the source file, read in 1 MiB chunks
+def file_hash(csv_file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(csv_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_meta(store_dir=STORE_DIR):
+    try:
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Short stable id of a parameter dict, for the file names of results derived from the store
+def params_id(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+# Write through a temporary file so concurrent readers never see a partial file
+def write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_meta(meta, store_dir):
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(meta, f, indent=2)
+    write_atomic(os.path.join(store_dir, META_FILE), write)
+
+
+# Convert the projected frame to an Arrow table, keeping NaN as a value
+def _to_arrow(data):
+    arrays = []
+    for column in data.columns:
+        series = data[column]
+        if hasattr(series, 'cat'):
+            # Missing names have code -1 and are stored as nulls
+            codes = series.cat.codes.to_numpy()
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0),
+                pa.array(series.cat.categories.astype(str).to_numpy()),
+            ))
+        else:
+            arrays.append(pa.array(np.ascontiguousarray(series.to_numpy()), from_pandas=False))
+    return pa.Table.from_arrays(arrays, names=list(data.columns))
+
+
+# Parse the CSV and (re)write the Arrow store plus its fingerprint metadata
+def build_store(csv_file_path=CSV_FILE_PATH, store_dir=STORE_DIR, sha256=None):
+    stat = source_stat(csv_file_path)
+    if sha256 is None:
+        sha256 = file_hash(csv_file_path)
+    # Rows are stored pre-sorted so the index can be built without copying the mapped columns
+    table = _to_arrow(sort_dataset(read_dataset(csv_file_path)))
+
+    os.makedirs(store_dir, exist_ok=True)
+    write_atomic(
+        os.path.join(store_dir, STORE_FILE),
+        lambda path: feather.write_feather(table, path, compression='uncompressed'),
+    )
+    meta = {
+        'version': STORE_VERSION,
+        'source': os.path.abspath(csv_file_path),
+        'sha256': sha256,
+        'rows': table.num_rows,
+        'columns': table.column_names,
+        **stat,
+    }
+    _write_meta(meta, store_dir)
+    return meta
+
+
+# Return up-to-date store metadata, rebuilding the store only when the CSV changed.
+# Size and mtime are checked first; the hash is only computed when they differ, so
+# a touched-but-identical file just refreshes the recorded stat.
+def ensure_store(csv_file_path=CSV_FILE_PATH, store_dir=STORE_DIR, force=False):
+    stat = source_stat(csv_file_path)
+    meta = read_meta(store_dir)
+    store_exists = os.path.exists(os.path.join(store_dir, STORE_FILE))
+    if force or meta is None or not store_exists or meta.get('version') != STORE_VERSION:
+        return build_store(csv_file_path, store_dir)
+    if meta['size'] == stat['size'] and meta['mtime_ns'] == stat['mtime_ns']:
+        return meta
+
+    sha256 = file_hash(csv_file_path)
+    if sha256 != meta['sha256']:
+        return build_store(csv_file_path, store_dir, sha256=sha256)
+    meta.update(stat)
+    _write_meta(meta, store_dir)
+    return meta
+
+
+# Fingerprint identifying the current contents of the dataset
+def dataset_fingerprint(csv_file_path=CSV_FILE_PATH, store_dir=STORE_DIR):
+    return ensure_store(csv_file_path, store_dir)['sha256']
+
+
+# Memory-map the Arrow store; numeric columns come back as zero-copy views
+def read_store(store_dir=STORE_DIR):
+    table = feather.read_table(os.path.join(store_dir, STORE_FILE), memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+# Load the projected dataset, building or refreshing the store on demand
+def load_dataset(csv_file_path=CSV_FILE_PATH, store_dir=STORE_DIR):
+    ensure_store(csv_file_path, store_dir)
+    return read_store(store_dir)
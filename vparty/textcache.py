@@ -0,0 +1,99 @@
+# Process-wide LRU cache of strings (serialized figures, API responses) under a byte budget
+#
+# Entries belong to one dataset fingerprint: a lookup with another fingerprint
+# drops them all. Concurrent misses on the same key wait for a single build.
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TextCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    # Forget the entries of another dataset fingerprint; call with the lock held
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self.fingerprint:
+            self._entries.clear()
+            self._bytes = 0
+            self.fingerprint = fingerprint
+
+    # Add an entry, then evict least recently used entries until back under budget; call with the lock held
+    def _insert(self, key, text):
+        self._entries[key] = text
+        self._bytes += len(text)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    # The string cached under `key`, or None; counts as a hit or a miss
+    def lookup(self, fingerprint, key):
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    # Cache a string built outside get_text (e.g. a response body collected while streaming)
+    def store(self, fingerprint, key, text):
+        with self._lock:
+            if fingerprint == self.fingerprint and key not in self._entries and len(text) <= self.max_bytes:
+                self._insert(key, text)
+
+    # Return the string cached under `key`, calling `build()` (which returns a
+    # string) on a miss. Entries built for another dataset fingerprint are
+    # discarded. Concurrent misses on the same key wait for a single build.
+    def get_text(self, fingerprint, key, build):
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            future = self._pending.get((fingerprint, key))
+            owner = future is None
+            if owner:
+                future = self._pending[(fingerprint, key)] = Future()
+
+        if not owner:
+            return future.result()
+        try:
+            text = build()
+        except BaseException as error:
+            with self._lock:
+                del self._pending[(fingerprint, key)]
+            future.set_exception(error)
+            raise
+
+        # Publish the entry and retire the pending build together, so a request in
+        # between finds one or the other and never starts a second build
+        with self._lock:
+            if fingerprint == self.fingerprint and key not in self._entries:
+                self._insert(key, text)
+            del self._pending[(fingerprint, key)]
+        future.set_result(text)
+        return text
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
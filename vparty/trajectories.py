@@ -0,0 +1,194 @@
+# Trajectory analytics of every (country, party, variable) series
+#
+# For each party's series of one position variable (its scored years, in order)
+# this computes a smoothed trend (centred moving average over SMOOTH_WINDOW
+# observations), the change since the previous observation, and flags that change
+# as a shift when it is unusually large for that variable: at least SHIFT_SIGMA
+# robust standard deviations (1.4826 x MAD) of all its changes, and never less
+# than MIN_SHIFT scale points.
+#
+# The work is vectorized over the grouped arrays of a row range (cumulative sums
+# with per-series bounds, no Python loop over parties). Datasets large enough to
+# pay for a process pool are split into one row range of whole countries per
+# worker (see MIN_TASK_ROWS). The result is one table aligned
+# with the store's rows - trend_<var>, delta_<var> and shift_<var> columns -
+# persisted next to the store, so a country's overlay is a row slice:
+#   <store>/trajectories/<fingerprint>-<params>.arrow
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from vparty import pools, store
+from vparty.data import CSV_FILE_PATH, POSITION_COLUMNS
+from vparty.index import group_runs
+
+TRAJECTORY_DIR = 'trajectories'
+SMOOTH_WINDOW = 3
+SHIFT_SIGMA = 3.0
+MIN_SHIFT = 0.75
+
+# Fewest rows per pool task. A block takes about 0.7 ms per 1000 rows and a pool
+# costs more than that to start, so smaller datasets (the real one has ~11k rows)
+# are computed in one block in this process.
+MIN_TASK_ROWS = 200_000
+
+
+# Trend and change columns of one variable over rows grouped into series by `series`
+def series_trend(values, series, window=SMOOTH_WINDOW):
+    trend = np.full(len(values), np.nan)
+    delta = np.full(len(values), np.nan)
+    rows = np.flatnonzero(~np.isnan(values))
+    if len(rows) == 0:
+        return trend, delta
+    scored = values[rows]
+    groups = series[rows]
+
+    # Bounds of each scored point's series within the scored points
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = groups[1:] != groups[:-1]
+    starts = np.flatnonzero(first)
+    stops = np.append(starts[1:], len(rows))
+    group = np.cumsum(first) - 1
+    position = np.arange(len(rows))
+
+    # Centred moving average from cumulative sums, truncated at the series bounds
+    half = window // 2
+    low = np.maximum(starts[group], position - half)
+    high = np.minimum(stops[group], position + half + 1)
+    cumulative = np.concatenate([[0.0], np.cumsum(scored)])
+    trend[rows] = (cumulative[high] - cumulative[low]) / (high - low)
+
+    change = np.empty(len(rows))
+    change[0] = np.nan
+    change[1:] = np.diff(scored)
+    change[first] = np.nan
+    delta[rows] = change
+    return trend, delta
+
+
+# Trend and change columns of every position variable for rows [start, stop)
+def trajectory_block(data, start, stop, window=SMOOTH_WINDOW):
+    rows = data.iloc[start:stop]
+    starts, stops = group_runs(rows['country_name'].cat.codes.to_numpy(), rows['v2paenname'].cat.codes.to_numpy())
+    series = np.repeat(np.arange(len(starts)), stops - starts)
+    columns = {}
+    for column in POSITION_COLUMNS:
+        trend, delta = series_trend(rows[column].to_numpy(dtype=np.float64), series, window)
+        columns[f"trend_{column}"] = trend.astype(np.float32)
+        columns[f"delta_{column}"] = delta.astype(np.float32)
+    return columns
+
+
+# Smallest change flagged as a shift, per variable
+def shift_thresholds(deltas, sigma=SHIFT_SIGMA, min_shift=MIN_SHIFT):
+    thresholds = {}
+    for column, delta in deltas.items():
+        delta = delta[~np.isnan(delta)]
+        mad = np.median(np.abs(delta - np.median(delta))) if len(delta) else 0.0
+        thresholds[column] = float(max(min_shift, sigma * 1.4826 * mad))
+    return thresholds
+
+
+# Row ranges of whole countries with about `task_rows` rows each
+def country_blocks(data, task_rows=MIN_TASK_ROWS):
+    starts, stops = group_runs(data['country_name'].cat.codes.to_numpy())
+    blocks = []
+    block_start = 0
+    for stop in stops:
+        if stop - block_start >= task_rows:
+            blocks.append((block_start, int(stop)))
+            block_start = int(stop)
+    if block_start < len(data):
+        blocks.append((block_start, len(data)))
+    return blocks
+
+
+# Per-worker dataset, memory-mapped from the store
+def _load_worker(store_dir):
+    return {'data': store.read_store(store_dir)}
+
+
+def _block(start, stop, window):
+    return start, trajectory_block(pools.state('trajectories')['data'], start, stop, window)
+
+
+def trajectory_path(store_dir, fingerprint, window=SMOOTH_WINDOW, sigma=SHIFT_SIGMA, min_shift=MIN_SHIFT):
+    params = {'window': window, 'sigma': sigma, 'min_shift': min_shift, 'variables': POSITION_COLUMNS}
+    return os.path.join(store_dir, TRAJECTORY_DIR, f"{fingerprint[:16]}-{store.params_id(params)}.arrow")
+
+
+# Compute the trajectory table for the store's rows and persist it
+def build_trajectories(csv_file_path=CSV_FILE_PATH, store_dir=store.STORE_DIR, window=SMOOTH_WINDOW,
+                       sigma=SHIFT_SIGMA, min_shift=MIN_SHIFT, workers=None, task_rows=None):
+    started = time.time()
+    meta = store.ensure_store(csv_file_path, store_dir)
+    data = pools.load_state('trajectories', _load_worker, store_dir)['data']
+    # One block per worker, unless that leaves blocks below MIN_TASK_ROWS
+    workers = workers or os.cpu_count()
+    blocks = country_blocks(data, task_rows or max(MIN_TASK_ROWS, -(-len(data) // workers)))
+
+    if workers == 1 or len(blocks) == 1:
+        results = [_block(start, stop, window) for start, stop in blocks]
+    else:
+        with pools.worker_pool('trajectories', _load_worker, store_dir, workers=workers) as pool:
+            results = list(pool.map(_block, *zip(*blocks), [window] * len(blocks)))
+    columns = {name: np.concatenate([block[name] for _, block in sorted(results, key=lambda result: result[0])])
+               for name in results[0][1]}
+
+    thresholds = shift_thresholds({column: columns[f"delta_{column}"] for column in POSITION_COLUMNS}, sigma, min_shift)
+    for column in POSITION_COLUMNS:
+        columns[f"shift_{column}"] = np.abs(columns[f"delta_{column}"]) >= thresholds[column]
+
+    table = pa.table({name: pa.array(values, from_pandas=False) for name, values in columns.items()})
+    table = table.replace_schema_metadata({'vparty': json.dumps({'fingerprint': meta['sha256'], 'thresholds': thresholds})})
+    path = trajectory_path(store_dir, meta['sha256'], window, sigma, min_shift)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store.write_atomic(path, lambda tmp_path: feather.write_feather(table, tmp_path, compression='uncompressed'))
+    return {'path': path, 'rows': table.num_rows, 'thresholds': thresholds, 'blocks': len(blocks), 'seconds': time.time() - started}
+
+
+# Precomputed trajectory table of one dataset, aligned with its rows
+class Trajectories:
+    def __init__(self, path):
+        table = feather.read_table(path, memory_map=True)
+        self.thresholds = json.loads(table.schema.metadata[b'vparty'])['thresholds']
+        self.key = os.path.basename(path)
+        self.table = table.to_pandas(split_blocks=True)
+
+    def trend(self, column, rows=slice(None)):
+        return self.table[f"trend_{column}"].to_numpy()[rows]
+
+    def delta(self, column, rows=slice(None)):
+        return self.table[f"delta_{column}"].to_numpy()[rows]
+
+    def shifts(self, column, rows=slice(None)):
+        return self.table[f"shift_{column}"].to_numpy()[rows]
+
+
+# Load the trajectory table of the current dataset, computing it first if needed
+def load_trajectories(csv_file_path=CSV_FILE_PATH, store_dir=store.STORE_DIR, workers=1):
+    path = trajectory_path(store_dir, store.ensure_store(csv_file_path, store_dir)['sha256'])
+    if not os.path.exists(path):
+        build_trajectories(csv_file_path, store_dir, workers=workers)
+    return Trajectories(path)
+
+
+# The n largest flagged shifts of one variable across all countries
+def biggest_shifts(data, trajectories, column, n=20):
+    delta = trajectories.delta(column)
+    rows = np.flatnonzero(trajectories.shifts(column))
+    rows = rows[np.argsort(-np.abs(delta[rows]), kind='stable')[:n]]
+    after = data[column].to_numpy(dtype=np.float64)[rows]
+    return pd.DataFrame({
+        'Country': data['country_name'].to_numpy()[rows],
+        'Party': data['v2paenname'].to_numpy()[rows],
+        'Year': data['year'].to_numpy()[rows],
+        'From': after - delta[rows],
+        'To': after,
+        'Change': delta[rows],
+    })
@@ -0,0 +1,171 @@
+# Background warm-up of the dashboard's caches, started once per server process
+#
+# A daemon thread loads the dataset, builds the row index and the label codes of
+# every variable, then builds the default charts (all years) of the most
+# requested (country, variable) pairs in a small thread pool. The charts go
+# through the pipeline, so they land in the shared figure cache, and a session
+# asking for a pair that is still being built waits for that one build instead
+# of repeating it. Sessions never wait for the warm-up itself; pairs not started
+# within WARMUP_SECONDS are skipped.
+#
+# The pairs are those of VPARTY_WARMUP_PAIRS ("Country:variable;Country" - a
+# country alone means all of its variables), then the most requested pairs in
+# the access counts that earlier runs persisted next to the store.
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from vparty import store
+from vparty.labels import LABEL_BINS
+from vparty.metadata import label_map
+
+WARMUP_ENABLED = os.environ.get('VPARTY_WARMUP', '') not in ('', '0')
+WARMUP_PAIRS = os.environ.get('VPARTY_WARMUP_PAIRS', '')
+WARMUP_TOP = int(os.environ.get('VPARTY_WARMUP_TOP', '24'))
+WARMUP_WORKERS = int(os.environ.get('VPARTY_WARMUP_WORKERS', '2'))
+WARMUP_SECONDS = float(os.environ.get('VPARTY_WARMUP_SECONDS', '120'))
+
+ACCESS_FILE = 'access_counts.json'
+
+# Access counts are written at most this often
+FLUSH_SECONDS = 30
+
+
+# (country, variable) pairs of a "Country:variable;Country" list; unknown names are ignored
+def parse_pairs(spec, countries):
+    known = set(countries)
+    pairs = []
+    for item in spec.split(';'):
+        country_name, _, variable = item.strip().partition(':')
+        if country_name not in known or (variable and variable not in label_map):
+            continue
+        pairs += [(country_name, variable)] if variable else [(country_name, variable) for variable in label_map]
+    return pairs
+
+
+# How often each (country, variable) pair was viewed, persisted across runs. Each
+# process writes its whole table, so with several processes the last write wins.
+class AccessCounts:
+    def __init__(self, path):
+        self.path = path
+        self._counts = Counter()
+        self._dirty = False
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for entry in json.load(f):
+                    self._counts[(entry['country'], entry['variable'])] = entry['count']
+
+    def record(self, country_name, variable):
+        with self._lock:
+            self._counts[(country_name, variable)] += 1
+            self._dirty = True
+            due = time.monotonic() - self._flushed >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [{'country': country_name, 'variable': variable, 'count': count}
+                       for (country_name, variable), count in self._counts.most_common()]
+            self._dirty = False
+            self._flushed = time.monotonic()
+
+        def write(path):
+            with open(path, 'w') as f:
+                json.dump(entries, f)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        store.write_atomic(self.path, write)
+
+    # The n most viewed pairs
+    def top(self, n):
+        with self._lock:
+            return [pair for pair, _ in self._counts.most_common(n)]
+
+
+def access_counts_path(store_dir=store.STORE_DIR):
+    return os.path.join(store_dir, ACCESS_FILE)
+
+
+# Pairs to warm: the configured ones, then the most viewed; without either, the
+# view every session starts on (first country, first variable)
+def warmup_pairs(countries, access_counts, spec=WARMUP_PAIRS, top=WARMUP_TOP):
+    known = set(countries)
+    pairs = parse_pairs(spec, countries)
+    pairs += [(country_name, variable) for country_name, variable in access_counts.top(top)
+              if country_name in known and variable in label_map]
+    if not pairs and countries:
+        pairs = [(countries[0], next(iter(label_map)))]
+    return list(dict.fromkeys(pairs))
+
+
+class Warmup:
+    # `load_pipeline()` returns the dashboard's Pipeline, loading the dataset on first call
+    def __init__(self, load_pipeline, access_counts, spec=WARMUP_PAIRS, top=WARMUP_TOP,
+                 workers=WARMUP_WORKERS, seconds=WARMUP_SECONDS):
+        self.load_pipeline = load_pipeline
+        self.access_counts = access_counts
+        self.spec = spec
+        self.top = top
+        self.workers = workers
+        self.seconds = seconds
+        self.status = {'state': 'pending', 'pairs': 0, 'built': 0, 'skipped': 0, 'seconds': None, 'error': None}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _update(self, **changes):
+        with self._lock:
+            self.status.update(changes)
+
+    def _increment(self, name):
+        with self._lock:
+            self.status[name] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='vparty-warmup', daemon=True)
+        self._thread.start()
+        return self
+
+    # Wait for the warm-up to finish (for scripts and benchmarks)
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+        return self.stats()
+
+    def _run(self):
+        started = time.monotonic()
+        try:
+            self._update(state='loading')
+            pipeline = self.load_pipeline()
+            for column in LABEL_BINS:
+                pipeline.labels.codes(column)
+            pairs = warmup_pairs(pipeline.index.countries, self.access_counts, self.spec, self.top)
+            self._update(state='building', pairs=len(pairs))
+            deadline = started + self.seconds
+            with ThreadPoolExecutor(self.workers, thread_name_prefix='vparty-warmup') as pool:
+                for future in [pool.submit(self._build, pipeline, country_name, variable, deadline) for country_name, variable in pairs]:
+                    future.result()
+            self._update(state='done')
+        except Exception as error:
+            self._update(state='failed', error=repr(error))
+        finally:
+            self._update(seconds=time.monotonic() - started)
+
+    # The charts and legend a session opening this pair asks for first
+    def _build(self, pipeline, country_name, variable, deadline):
+        if time.monotonic() > deadline:
+            self._increment('skipped')
+            return
+        pipeline.line_json(country_name, variable)
+        pipeline.scatter_json(country_name, variable)
+        pipeline.legend(country_name, variable)
+        self._increment('built')
+
+    def stats(self):
+        with self._lock:
+            return dict(self.status)